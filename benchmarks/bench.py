@@ -0,0 +1,148 @@
+"""Benchmarks for the core combinators.
+
+Each scenario builds a sweep and iterates it, reporting throughput, time to the first config and
+the tracemalloc peak.  Results are compared against a baseline stored next to this file, and the
+script exits with status 1 if any scenario regressed by more than the tolerance.  Baselines are
+specific to a machine, so they aren't committed, save one locally before comparing:
+
+    python benchmarks/bench.py --save     # record benchmarks/baseline.json
+    python benchmarks/bench.py            # compare against it
+    python benchmarks/bench.py -k zip     # only scenarios matching a substring
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import cdict as C  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def sum_chain() -> C.cdict_base:
+    # + one part at a time, as built up in a loop
+    return functools.reduce(lambda a, b: a + b, [C.dict(a=i, b=C.list(0, 1)) for i in range(5000)])
+
+
+def wide_dict() -> C.cdict_base:
+    return C.dict(**{f"k{i}": C.list(*range(4)) for i in range(8)})
+
+
+def product_chain() -> C.cdict_base:
+    return functools.reduce(lambda a, b: a * b, [C.dict(**{f"k{i}": C.list(0, 1)}) for i in range(16)])
+
+
+def nested_dict() -> C.cdict_base:
+    return C.dict(
+        model=C.dict(width=C.iter(range(16)), depth=C.iter(range(16)), act="relu"),
+        optim=C.dict(lr=C.iter(range(16)), wd=C.iter(range(16))),
+        data=C.dict(name="x", size=C.overridable(3)),
+    )
+
+
+def zip_sweep() -> C.cdict_base:
+    grid = C.dict(a=C.iter(range(256)), b=C.iter(range(256)))
+    return grid | grid.map(lambda x: dict(c=x["a"] * x["b"]))
+
+
+def filter_apply() -> C.cdict_base:
+    grid = C.dict(a=C.iter(range(256)), b=C.iter(range(256)))
+    return (
+        grid.filter(lambda x: (x["a"] + x["b"]) % 3 != 0)
+        .map(lambda x: x | dict(c=x["a"] - x["b"]))
+        .apply(lambda x: [x | dict(seed=s) for s in range(2)])
+    )
+
+
+SCENARIOS: Dict[str, Callable[[], C.cdict_base]] = {
+    "sum_chain": sum_chain,
+    "wide_dict": wide_dict,
+    "product_chain": product_chain,
+    "nested_dict": nested_dict,
+    "zip_sweep": zip_sweep,
+    "filter_apply": filter_apply,
+}
+
+
+def measure(make: Callable[[], C.cdict_base], repeat: int) -> Dict[str, float]:
+    # best of repeat runs for timings, which are the least noisy
+    throughput, first = 0.0, float("inf")
+    for _ in range(repeat):
+        sweep = make()
+        t0 = time.perf_counter()
+        it = iter(sweep)
+        next(it)
+        t1 = time.perf_counter()
+        n = 1 + sum(1 for _ in it)
+        t2 = time.perf_counter()
+        throughput = max(throughput, n / (t2 - t0))
+        first = min(first, t1 - t0)
+    # memory separately, since tracing slows everything down
+    tracemalloc.start()
+    for _ in make():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(configs=n, configs_per_s=throughput, first_item_s=first, peak_bytes=peak)
+
+
+def regressions(name: str, result: Dict[str, float], base: Dict[str, float], tolerance: float) -> List[str]:
+    found = []
+    if result["configs_per_s"] < base["configs_per_s"] * (1 - tolerance):
+        found.append(f"{name}: {result['configs_per_s']:,.0f} configs/s, baseline {base['configs_per_s']:,.0f}")
+    # ignore sub-millisecond differences in time to first config, which are noise
+    if result["first_item_s"] > base["first_item_s"] * (1 + tolerance) + 1e-3:
+        found.append(f"{name}: first config after {result['first_item_s']:.4f}s, baseline {base['first_item_s']:.4f}s")
+    if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance) + (1 << 16):
+        found.append(f"{name}: peak memory {result['peak_bytes']:,} bytes, baseline {base['peak_bytes']:,}")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", default="", help="only run scenarios whose name contains this")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative regression")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    failures = []
+    for name, make in SCENARIOS.items():
+        if args.k not in name:
+            continue
+        result = measure(make, args.repeat)
+        results[name] = result
+        print(
+            f"{name:>14}: {result['configs']:>7,} configs  {result['configs_per_s']:>10,.0f} configs/s  "
+            f"first {result['first_item_s'] * 1e3:7.2f}ms  peak {result['peak_bytes'] / 1e6:7.2f}MB"
+        )
+        if not args.save and name in baseline:
+            failures.extend(regressions(name, result, baseline[name], args.tolerance))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"saved baseline to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"no baseline yet at {args.baseline}, run with --save to record one for this machine")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
-from builtins import sum as builtin_sum
-from typing import Any, Iterable
-from .core import cdict_base, cdict_dict, cdict_iter
-from .utils import overridable, override, combinable, combiner, lazy
+from typing import Any, Iterable, Tuple
+from .core import cdict_base, cdict_dict, cdict_iter, _concat
+from .store import load as _load
+from .profile import profile
+from .diff import diff as _diff
+from .fingerprint import fingerprint as _fingerprint
+from .utils import overridable, override, combinable, combiner, lazy, lazy_cache
 
 class C():
     @staticmethod
@@ -26,12 +29,24 @@ class C():
 
     @staticmethod
     def sum(args: Iterable[cdict_base]) -> cdict_base:
-        return builtin_sum(args, C.list())
+        return _concat(args)
 
     @staticmethod
     def item(x: Any) -> cdict_base:
         return C.list(x)
 
+    @staticmethod
+    def load(path: str) -> cdict_base:
+        return _load(path)
+
+    @staticmethod
+    def diff(old: cdict_base, new: cdict_base) -> Tuple[cdict_base, cdict_base]:
+        return _diff(old, new)
+
+    @staticmethod
+    def fingerprint(cfg: Any) -> str:
+        return _fingerprint(cfg)
+
 
 dict = C.dict
 cdict = C.dict
@@ -47,6 +62,12 @@ sum = C.sum
 csum = C.sum
 item = C.item
 citem = C.item
+load = C.load
+cload = C.load
+diff = C.diff
+cdiff = C.diff
+fingerprint = C.fingerprint
+cfingerprint = C.fingerprint
 coverridable = overridable
 coverride = override
 ccombinable = combinable
@@ -68,6 +89,12 @@ __all__ = [
     'csum',
     'item',
     'citem',
+    'load',
+    'cload',
+    'diff',
+    'cdiff',
+    'fingerprint',
+    'cfingerprint',
     'overridable',
     'coverridable',
     'override',
@@ -76,4 +103,7 @@ __all__ = [
     'ccombinable',
     'combiner',
     'ccombiner',
+    'lazy',
+    'lazy_cache',
+    'profile',
 ]
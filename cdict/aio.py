@@ -0,0 +1,120 @@
+from __future__ import annotations
+import asyncio
+import collections
+import concurrent.futures
+import inspect
+import itertools
+import threading
+from typing import Any, AsyncGenerator, Awaitable, Callable, TYPE_CHECKING
+
+from .core import recursive_cdict_item
+
+if TYPE_CHECKING:
+    from .core import cdict_base, _cdict_apply
+
+# how many values to produce per trip to a thread, when iterating synchronous cdicts from async code
+_THREAD_CHUNK = 64
+
+
+async def _aapply_chunk(fn: Callable[[Any], Any], raw: bool, xs: list[Any], limit: asyncio.Semaphore) -> list[list[Any]]:
+    # the async counterpart of core._apply_chunk, fn may return an awaitable, an async generator or values
+    results = []
+    for x in xs:
+        async with limit:
+            r = fn(x if raw else recursive_cdict_item(x))
+            if inspect.isawaitable(r):
+                r = await r
+            if inspect.isasyncgen(r):
+                results.append([v async for v in r])
+            else:
+                results.append(list(r))
+    return results
+
+
+class _amap_fn():
+    # async apply function yielding fn of each value
+    def __init__(self, fn: Callable[[Any], Awaitable[Any]]) -> None:
+        self._fn = fn
+
+    async def __call__(self, x: Any) -> list[Any]:
+        return [await self._fn(x)]
+
+    def __repr__(self) -> str:
+        return f"amap({self._fn})"
+
+
+class _akeep_fn():
+    # async apply function yielding the values that pass fn
+    def __init__(self, fn: Callable[[Any], Awaitable[bool]]) -> None:
+        self._fn = fn
+
+    async def __call__(self, x: Any) -> list[Any]:
+        return [x] if await self._fn(x) else []
+
+    def __repr__(self) -> str:
+        return f"afilter({self._fn})"
+
+
+class _loop_thread():
+    # An event loop on a background thread, with an Executor-like submit, so that synchronous
+    # iteration (e.g. of a product containing an async map) can run coroutines concurrently.
+    def __init__(self, concurrency: int) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._limit = asyncio.Semaphore(concurrency)
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> concurrent.futures.Future[Any]:
+        return asyncio.run_coroutine_threadsafe(fn(*args, self._limit), self._loop)
+
+    async def _cancel_all(self) -> None:
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+async def thread_values(c: cdict_base) -> AsyncGenerator[Any, None]:
+    # iterate a synchronous cdict on a thread, so the event loop stays free
+    loop = asyncio.get_running_loop()
+    it = c.cdict_iter()
+    while True:
+        chunk = await loop.run_in_executor(None, lambda: list(itertools.islice(it, _THREAD_CHUNK)))
+        if not chunk:
+            return
+        for x in chunk:
+            yield x
+
+
+async def apply_values(c: _cdict_apply) -> AsyncGenerator[Any, None]:
+    # run an async apply on the running loop, keeping a bounded number of values in flight
+    concurrency = c._concurrency or 1
+    limit = asyncio.Semaphore(concurrency)
+    pending: collections.deque[asyncio.Future[list[list[Any]]]] = collections.deque()
+
+    async def next_done() -> list[list[Any]]:
+        if c._ordered:
+            return await pending.popleft()
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        f = next(iter(done))
+        pending.remove(f)
+        return f.result()
+
+    try:
+        async for x in c._inner._acdict_iter():
+            if len(pending) >= 2 * concurrency:
+                for v in c._results(await next_done()):
+                    yield v
+            pending.append(asyncio.ensure_future(_aapply_chunk(c._fn, c.raw, [x], limit)))
+        while pending:
+            for v in c._results(await next_done()):
+                yield v
+    finally:
+        for f in pending:
+            f.cancel()
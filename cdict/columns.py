@@ -0,0 +1,77 @@
+from __future__ import annotations
+import importlib
+from typing import Any, Sequence, TYPE_CHECKING
+
+from .core import _axes_layout
+
+if TYPE_CHECKING:
+    from .core import cdict_base
+
+
+def _numpy() -> Any:
+    try:
+        return importlib.import_module("numpy")
+    except ImportError:
+        raise ImportError("to_columns requires numpy, install it with `pip install numpy`") from None
+
+
+def _column_name(path: Sequence[Any]) -> str:
+    return ".".join(str(k) for k in path)
+
+
+def _array(np: Any, values: Sequence[Any]) -> Any:
+    # numpy would coerce mixed types to a common one (e.g. strings) or make sequences into extra dimensions
+    types = set(type(v) for v in values)
+    if types and (len(types) == 1 or types <= {bool, int, float}) and not types & {list, tuple, dict}:
+        return np.asarray(values)
+    arr = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        arr[i] = v
+    return arr
+
+
+def _flatten(d: Any, prefix: tuple[Any, ...], out: dict[tuple[Any, ...], Any]) -> None:
+    for k, v in d.items():
+        if isinstance(v, dict) and v:
+            _flatten(v, prefix + (k,), out)
+        else:
+            out[prefix + (k,)] = v
+
+
+def to_columns(c: cdict_base) -> dict[str, Any]:
+    np = _numpy()
+    axes = c._axes()
+    if axes is not None:
+        _, layout = _axes_layout(axes)
+        return {
+            _column_name(path): np.tile(np.repeat(_array(np, values), repeats), tiles)
+            for (path, values), (repeats, tiles) in zip(axes, layout)
+        }
+
+    missing = object()
+    cols: dict[tuple[Any, ...], list[Any]] = {}
+    n = 0
+    row: dict[tuple[Any, ...], Any] = {}
+    for d in c:
+        row.clear()
+        _flatten(d, (), row)
+        for path, v in row.items():
+            col = cols.get(path)
+            if col is None:
+                col = cols[path] = [missing] * n
+            col.append(v)
+        n += 1
+        for col in cols.values():
+            if len(col) < n:
+                col.append(missing)
+    columns = {}
+    for path, col in cols.items():
+        mask = [v is missing for v in col]
+        if not any(mask):
+            columns[_column_name(path)] = _array(np, col)
+        else:
+            # masked where missing, with masked entries filled by some present value to keep the dtype
+            fill = next(v for v in col if v is not missing)
+            data = _array(np, [fill if m else v for v, m in zip(col, mask)])
+            columns[_column_name(path)] = np.ma.masked_array(data, mask=mask)
+    return columns
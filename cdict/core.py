@@ -1,10 +1,26 @@
 from __future__ import annotations
 import functools
-from typing import Any, Union, Iterable, Optional, Generator, Tuple, Callable, ItemsView, cast
+from typing import Any, AsyncIterator, Union, Iterable, Iterator, Optional, Generator, Tuple, Callable, ItemsView, Mapping, Sequence, cast, overload
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
 import itertools
+import math
+import operator
+import os
+import random
 
 
 AnyDict = dict[Any, Any]
+# a key path into nested dicts, and the values it takes along one dimension of a grid
+Axis = Tuple[Tuple[Any, ...], Sequence[Any]]
+
+# how many values of a product operand get cached for replay before falling back to re-iterating it
+_REPLAY_LIMIT = 1 << 16
+
+# the active cdict.profile, if any
+_profiler: Any = None
 
 
 def recursive_map_dict(x: Any, f: Callable[[Any], Any]) -> Any:
@@ -14,11 +30,73 @@ def recursive_map_dict(x: Any, f: Callable[[Any], Any]) -> Any:
         return f(x)
 
 
+# how recursive_cdict_item treats values, cached per type
+_PLAIN, _DICT, _VALUE, _ITEM = range(4)
+_item_kinds: dict[type, int] = {}
+
+
+def _item_kind(t: type) -> int:
+    kind = _item_kinds.get(t)
+    if kind is None:
+        if issubclass(t, dict):
+            kind = _DICT
+        elif t is _cdict_value:
+            kind = _VALUE
+        elif hasattr(t, "cdict_item"):
+            kind = _ITEM
+        else:
+            kind = _PLAIN
+        _item_kinds[t] = kind
+    return kind
+
+
 def recursive_cdict_item(x: Any) -> Any:
-    return recursive_map_dict(x, lambda x: x.cdict_item() if hasattr(x, "cdict_item") else x)
+    # same as recursive_map_dict with cdict_item, but only calls cdict_item on types that define it
+    kind = _item_kinds.get(type(x))
+    if kind is None:
+        kind = _item_kind(type(x))
+    if kind == _PLAIN:
+        return x
+    if kind == _DICT:
+        return {k: recursive_cdict_item(v) for k, v in x.items()}
+    if kind == _VALUE:
+        return {k: recursive_cdict_item(v) for k, v in x.d.items()}
+    return x.cdict_item()
+
+
+def _canonical(x: Any) -> Any:
+    # hashable form of what x unwraps to, equal exactly when the unwrapped values are the same,
+    # tagged with types so that e.g. 1, 1.0 and True differ, and floats by repr so 0.0 and -0.0 do
+    kind = _item_kinds.get(type(x))
+    if kind is None:
+        kind = _item_kind(type(x))
+    if kind == _VALUE:
+        x = x.d
+    elif kind == _ITEM:
+        return _canonical(x.cdict_item())
+    if kind != _PLAIN:
+        return (dict, frozenset((_canonical(k), _canonical(v)) for k, v in x.items()))
+    t = type(x)
+    if t is float:
+        return (float, repr(x))
+    if isinstance(x, (list, tuple)):
+        return (t, tuple(_canonical(v) for v in x))
+    if isinstance(x, (set, frozenset)):
+        return (t, frozenset(_canonical(v) for v in x))
+    try:
+        hash(x)
+    except TypeError:
+        return (t, repr(x))
+    return (t, x)
 
 
 class _cdict_value():
+    # _hash and _view are only set once cdict.fingerprint has hashed the value, or cdict.frozen
+    # has made a read-only view of it
+    __slots__ = ("d", "final", "_hash", "_view")
+    _hash: int
+    _view: Mapping[Any, Any]
+
     def __init__(self, d: AnyDict, final: bool = False):
         self.d = d
         self.final = final
@@ -59,29 +137,87 @@ class _cdict_value():
         return self.d.items()
 
 
+def _profiled(f: Callable[[Any], Iterator[Any]]) -> Callable[[Any], Iterator[Any]]:
+    # wraps a cdict_iter implementation to report to the active profiler
+    @functools.wraps(f)
+    def cdict_iter(self: cdict_base) -> Iterator[Any]:
+        if _profiler is None:
+            return f(self)
+        return cast("Iterator[Any]", _profiler._wrap(self, f(self)))
+    return cdict_iter
+
+
 class cdict_base():
-    def apply(self, fn: Callable[[Any], Any], raw: bool = False) -> cdict_base:
-        return _cdict_apply(fn, self, raw=raw)
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        if "cdict_iter" in cls.__dict__:
+            setattr(cls, "cdict_iter", _profiled(cls.__dict__["cdict_iter"]))
+
+    def apply(
+        self, fn: Callable[[Any], Any], raw: bool = False,
+        executor: Optional[concurrent.futures.Executor] = None, chunksize: int = 1, ordered: bool = True,
+        window: Optional[int] = None,
+    ) -> cdict_base:
+        return _cdict_apply(fn, self, raw=raw, executor=executor, chunksize=chunksize, ordered=ordered, window=window)
+
+    def map(
+        self, fn: Callable[[Any], Any], raw: bool = False,
+        executor: Optional[concurrent.futures.Executor] = None, chunksize: int = 1, ordered: bool = True,
+        window: Optional[int] = None,
+    ) -> cdict_base:
+        return _cdict_apply(_map_fn(fn), self, raw=raw, executor=executor, chunksize=chunksize, ordered=ordered, window=window)
+
+    def filter(
+        self, fn: Callable[[Any], bool], raw: bool = False, keys: Optional[Iterable[Any]] = None,
+        executor: Optional[concurrent.futures.Executor] = None, chunksize: int = 1, ordered: bool = True,
+        window: Optional[int] = None,
+    ) -> cdict_base:
+        pool: dict[str, Any] = dict(executor=executor, chunksize=chunksize, ordered=ordered, window=window)
+        if keys is not None:
+            # fn only reads these keys, so it can run on the part of the sweep that produces them,
+            # before those values get combined with everything else
+            pushed = _push_filter(self, _filter_fn(fn, raw), frozenset(keys), **pool)
+            return pushed if raw else _cdict_apply(_yield_fn, pushed)
+        return _cdict_apply(_keep_fn(fn), self, raw=raw, **pool)
+
+    def aapply(self, fn: Callable[[Any], Any], raw: bool = False, concurrency: int = 16, ordered: bool = True) -> cdict_base:
+        return _cdict_apply(fn, self, raw=raw, concurrency=concurrency, ordered=ordered)
+
+    def amap(self, fn: Callable[[Any], Any], raw: bool = False, concurrency: int = 16, ordered: bool = True) -> cdict_base:
+        from .aio import _amap_fn
+        return _cdict_apply(_amap_fn(fn), self, raw=raw, concurrency=concurrency, ordered=ordered)
 
-    def map(self, fn: Callable[[Any], Any], raw: bool = False) -> cdict_base:
-        @functools.wraps(fn)
-        def apply_fn(x: Any) -> Any:
-            yield fn(x)
-        return _cdict_apply(apply_fn, self, raw=raw)
+    def afilter(self, fn: Callable[[Any], Any], raw: bool = False, concurrency: int = 16, ordered: bool = True) -> cdict_base:
+        from .aio import _akeep_fn
+        return _cdict_apply(_akeep_fn(fn), self, raw=raw, concurrency=concurrency, ordered=ordered)
 
-    def filter(self, fn: Callable[[Any], bool], raw: bool = False) -> cdict_base:
-        @functools.wraps(fn)
-        def apply_fn(x: Any) -> Any:
-            if fn(x): yield x
-        return _cdict_apply(apply_fn, self, raw=raw)
+    def sample(self, k: int, seed: Optional[int] = None, method: str = "uniform") -> cdict_base:
+        return _cdict_sample(self, k, seed=seed, method=method)
+
+    def fingerprints(self) -> Iterator[Tuple[str, AnyDict]]:
+        # (fingerprint, config) pairs, with the same fingerprint as cdict.fingerprint(config)
+        from .fingerprint import fingerprints
+        return fingerprints(self)
+
+    def frozen(self) -> Iterator[Mapping[Any, Any]]:
+        # Like iterating, but yielding read-only views of the dicts, with equal sub-dicts and
+        # leaves shared between configs rather than copied into each one
+        from .frozen import frozen
+        return frozen(self)
+
+    def distinct(self, approx: bool = False, max_bytes: int = 1 << 24) -> cdict_base:
+        return _cdict_distinct(self, approx=approx, max_bytes=max_bytes)
 
     def __add__(self, other: cdict_base) -> cdict_base:
-        return cdict_iter([self, other])
+        return _concat([self, other])
 
     def __mul__(self, other: cdict_base) -> cdict_base:
         if not isinstance(other, cdict_base):
             return NotImplemented
-        return _cdict_product(self, other)
+        # extend a product on the left rather than nesting it, which is equivalent since
+        # combining folds left to right, (a * b) * c combines as (a . b) . c
+        items = self._items if type(self) is _cdict_product else (self,)
+        return _cdict_product(*items, other)
 
     def __or__(self, other: cdict_base) -> cdict_base:
         return _cdict_zip([self, other])
@@ -90,32 +226,460 @@ class cdict_base():
         raise NotImplementedError("Please override this method")
 
     def __iter__(self) -> Generator[AnyDict, None, None]:
+        grid = self._grid()
+        if grid is not None and grid.small() and _profiler is None:
+            yield from grid.items()
+            return
         for x in self.cdict_iter():
             yield recursive_cdict_item(x)
 
+    def _grid(self) -> Optional[_grid]:
+        # this cdict compiled to a flat product of leaves, if it's that simple
+        return None
+
+    def iter_from(self, cursor: Any = None) -> _cursor_iterator:
+        return _cursor_iterator(self, cursor)
+
+    async def aiter(self) -> AsyncIterator[AnyDict]:
+        async for x in self._acdict_iter():
+            yield recursive_cdict_item(x)
+
+    def _acdict_iter(self) -> AsyncIterator[Any]:
+        # cdict_iter for async code, by default iterating on a thread so the event loop isn't blocked
+        from .aio import thread_values
+        return thread_values(self)
+
+    def _len(self) -> Optional[int]:
+        # number of values yielded by cdict_iter, or None if it can't be known without iterating
+        return None
+
+    def size(self, strict: bool = False) -> int:
+        n = self._len()
+        if n is None:
+            if strict:
+                raise TypeError(f"Cannot determine size of {self} without iterating")
+            if not self._reiterable():
+                # counting would use up one-shot iterators
+                raise TypeError(f"Cannot determine size of {self} without consuming it")
+            n = sum(1 for _ in self.cdict_iter())
+        return n
+
     def __len__(self) -> int:
-        return len(list(iter(self)))
+        # counts by iterating when the size isn't known from the structure, and list() calls len()
+        # first, so list(iter(sweep)) avoids running filters and maps twice
+        return self.size()
+
+    def materialize(self) -> cdict_base:
+        # the values as a table of per-key pools of distinct values and integer codes into them,
+        # which is much smaller than a list of dicts when keys take few distinct values
+        from .table import materialize
+        return materialize(self)
+
+    def to_columns(self) -> dict[str, Any]:
+        from .columns import to_columns
+        return to_columns(self)
+
+    def explain(self, profile: Any = None) -> None:
+        # print the tree of nodes with their sizes, and what profile measured for them
+        from .profile import explain
+        print(explain(self, profile))
+
+    def dump(self, path: str, format: str = "jsonl") -> int:
+        from .store import dump
+        return dump(self, path, format=format)
+
+    def head(self, k: int) -> cdict_base:
+        return self[:k]
+
+    def shard(self, k: int, n: int, layout: str = "contiguous") -> cdict_base:
+        if not 0 <= k < n:
+            raise ValueError(f"Shard index {k} out of range for {n} shards")
+        if layout == "strided":
+            return self[k::n]
+        if layout != "contiguous":
+            raise ValueError(f"Unknown shard layout {layout!r}, expected 'contiguous' or 'strided'")
+        if self._len() is None and not self._reiterable():
+            # one-shot, so counting would use it up, the shard buffers it instead
+            return _cdict_buffered_shard(self, k, n)
+        # for unindexable cdicts this counts by iterating, and the shard then skips ahead
+        size = self.size()
+        return self[k * size // n:(k + 1) * size // n]
+
+    def _reiterable(self) -> bool:
+        # whether cdict_iter can be called again to yield the same values
+        return False
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        # every key the yielded cdict values can have, or None if unknown (or not dicts)
+        return None
+
+    def _axes(self) -> Optional[list[Axis]]:
+        # If this is a plain grid, i.e. the yielded dicts are exactly the product of some axes of plain
+        # values (varying the last axis fastest), those axes, read off the compiled grid.  Otherwise None.
+        grid = self._grid()
+        return None if grid is None else grid.plain_axes()
+
+    def _radices(self) -> Optional[list[int]]:
+        # sizes of the dimensions whose mixed radix digits (last varying fastest) make up the index
+        n = self._len()
+        return None if n is None else [n]
+
+    def _len_bound(self) -> Optional[int]:
+        # an upper bound on _len, if it can't be known exactly
+        return self._len()
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        # the cdicts this one is built from, each with a prefix to show it with in explain
+        return []
+
+    def _label(self) -> str:
+        # how explain shows this node, which for composite nodes leaves out their children
+        return repr(self)
+
+    def _get(self, i: int) -> Any:
+        # the i-th value yielded by cdict_iter, for 0 <= i < self._len()
+        raise NotImplementedError(f"{type(self).__name__} does not support indexing")
+
+    def _iter_from(self, i: int) -> Iterator[Any]:
+        # the values yielded by cdict_iter from the i-th on
+        n = self._len()
+        if n is None:
+            return itertools.islice(self.cdict_iter(), i, None)
+        return map(self._get, range(i, n))
+
+    def _cursor_iter(self, cursor: Any) -> Iterator[Tuple[Any, Any, Any]]:
+        # The values yielded by cdict_iter after the position cursor (None for the start), each with
+        # cursors to resume at it and after it.  Cursors are built from ints, None and lists so that
+        # they round trip through JSON.  Here they count the values already yielded, which for
+        # unindexable cdicts means iterating past them again.
+        start = cursor or 0
+        return zip(self._iter_from(start), itertools.count(start), itertools.count(start + 1))
+
+    @overload
+    def __getitem__(self, i: int) -> Any: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> cdict_base: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return _cdict_slice(self, i)
+        i = operator.index(i)
+        n = self._len()
+        if n is None:
+            # not indexable, find the item by iterating
+            if i < 0:
+                return recursive_cdict_item(list(self.cdict_iter())[i])
+            for x in itertools.islice(self.cdict_iter(), i, None):
+                return recursive_cdict_item(x)
+            raise IndexError("cdict index out of range")
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("cdict index out of range")
+        return recursive_cdict_item(self._get(i))
 
     def __pos__(self) -> cdict_base:
         return self
 
 
-def _combine_dicts(ds: Iterable[AnyDict]) -> AnyDict:
-    res: AnyDict = {}
+def _combine_key(k: Any, v1: Any, v2: Any) -> Any:
+    if _profiler is not None:
+        _profiler._conflict()
+    if hasattr(v1, "cdict_combine"):
+        return v1.cdict_combine(v2)
+    elif hasattr(v2, "cdict_rcombine"):
+        return v2.cdict_rcombine(v1)
+    else:
+        raise ValueError(f"No cdict_combine method found.  Cannot combine key {k}: {v1} and {v2}")
+
+
+def _combine_dicts(ds: Iterable[AnyDict], overlap: Optional[frozenset[Any]] = None) -> AnyDict:
+    if _profiler is not None:
+        _profiler._merge()
+    if overlap is not None:
+        # only keys in overlap can appear in more than one dict, so everything else is a plain merge
+        ds = list(ds)
+        res: AnyDict = {}
+        for d in ds:
+            res.update(d)
+        for k in overlap:
+            if k in res:
+                vs = [d[k] for d in ds if k in d]
+                v = vs[0]
+                for w in vs[1:]:
+                    v = _combine_key(k, v, w)
+                res[k] = v
+        return res
+    res = {}
     for d in ds:
         for k, v in d.items():
             if k in res:
-                if hasattr(res[k], "cdict_combine"):
-                    res[k] = res[k].cdict_combine(v)
-                elif hasattr(v, "cdict_rcombine"):
-                    res[k] = v.cdict_rcombine(res[k])
-                else:
-                    raise ValueError(f"No cdict_combine method found.  Cannot combine key {k}: {res[k]} and {v}")
+                res[k] = _combine_key(k, res[k], v)
             else:
                 res[k] = v
     return res
 
 
+def _combine_values(vs: Sequence[Any], overlap: Optional[frozenset[Any]] = None) -> Any:
+    # left fold of cdict_combine over vs, merging cdict values in a single pass
+    if len(vs) == 1:
+        return vs[0]
+    if all(isinstance(v, _cdict_value) for v in vs):
+        if any(v.final for v in vs[:-1]):
+            raise ValueError("Value already finalized")
+        return _cdict_value(_combine_dicts([v.d for v in vs], overlap), final=vs[-1].final)
+    return functools.reduce(lambda x, y: x.cdict_combine(y), vs)
+
+
+def _item_iter_from(d: Any, i: int) -> Iterator[Any]:
+    # the values _iter_values(d) yields from the i-th on
+    if isinstance(d, cdict_base):
+        return d._iter_from(i)
+    return itertools.islice(_iter_values(d), i, None)
+
+
+def _digits(i: int, sizes: Sequence[int]) -> list[int]:
+    # mixed radix digits of i, last varying fastest
+    ds = []
+    for n in reversed(sizes):
+        i, r = divmod(i, n)
+        ds.append(r)
+    return ds[::-1]
+
+
+class _cursor_iterator():
+    # iterates over a cdict like iter() does, keeping track of a cursor to resume from with iter_from
+    def __init__(self, c: cdict_base, cursor: Any = None) -> None:
+        self.cursor = cursor
+        self._it = c._cursor_iter(cursor)
+
+    def __iter__(self) -> _cursor_iterator:
+        return self
+
+    def __next__(self) -> Any:
+        x, _, self.cursor = next(self._it)
+        return recursive_cdict_item(x)
+
+
+def _concat(parts: Iterable[Any]) -> cdict_base:
+    # + is associative, so concatenations nested in the parts get spliced into one flat node, but
+    # only once the sum is used (see cdict_iter._parts), so that building a sum one + at a time
+    # doesn't copy all the parts so far at every step
+    return cdict_iter(tuple(parts))
+
+
+def _item_len(d: Any) -> Optional[int]:
+    # number of values _iter_values(d) yields, if known
+    if isinstance(d, cdict_base):
+        return d._len()
+    if hasattr(d, "cdict_iter"):
+        return None
+    return 1
+
+
+def _item_len_bound(d: Any) -> Optional[int]:
+    if isinstance(d, cdict_base):
+        return d._len_bound()
+    return _item_len(d)
+
+
+def _bounds_prod(bounds: Iterable[Optional[int]]) -> Optional[int]:
+    n = 1
+    for m in bounds:
+        if m is None:
+            return None
+        n *= m
+    return n
+
+
+def _item_get(d: Any, i: int) -> Any:
+    # the i-th value _iter_values(d) yields, for d with known _item_len
+    if isinstance(d, cdict_base):
+        return d._get(i)
+    return d
+
+
+def _item_keys(d: Any) -> Optional[frozenset[Any]]:
+    if isinstance(d, cdict_base):
+        return d._keys()
+    return None
+
+
+def _union_keys(ds: Iterable[Any]) -> Optional[frozenset[Any]]:
+    keys: frozenset[Any] = frozenset()
+    for d in ds:
+        ks = _item_keys(d)
+        if ks is None:
+            return None
+        keys |= ks
+    return keys
+
+
+def _is_plain(x: Any) -> bool:
+    # a value that is yielded as is, and can't combine with anything
+    return _item_kind(type(x)) == _PLAIN and not any(
+        hasattr(x, a) for a in ("cdict_combine", "cdict_rcombine", "cdict_iter")
+    )
+
+
+def _leaf_values(d: Any) -> Optional[Sequence[Any]]:
+    # the values of a dict value that yields no cdicts, as a sequence
+    if not hasattr(d, "cdict_iter"):
+        return (d,)
+    if type(d) is cdict_iter and isinstance(d._parts, (list, tuple, range)):
+        if isinstance(d._parts, range) or not any(hasattr(x, "cdict_iter") for x in d._parts):
+            return d._parts
+    return None
+
+
+def _axes_layout(axes: Sequence[Axis]) -> Tuple[int, list[Tuple[int, int]]]:
+    # The number of configs in a grid of these axes, and per axis how many times in a row each of
+    # its values repeats (once per combination of the axes after it) and how many times that pattern
+    # tiles (once per combination of the axes before it).
+    n = math.prod(len(vs) for _, vs in axes)
+    if n == 0:
+        # an empty axis leaves nothing to repeat
+        return 0, [(0, 0)] * len(axes)
+    layout = []
+    repeats, tiles = n, 1
+    for _, vs in axes:
+        repeats //= len(vs)
+        layout.append((repeats, tiles))
+        tiles *= len(vs)
+    return n, layout
+
+
+class _grid_node():
+    # where the leaves of one (possibly nested) dict go, each entry an index into the leaves or a nested node
+    __slots__ = ("final", "entries")
+
+    def __init__(self) -> None:
+        self.final = False
+        self.entries: dict[Any, Union[int, _grid_node]] = {}
+
+
+class _grid():
+    # A cdict_dict or product of them whose dicts, at any depth, are the product of independent
+    # leaves, compiled to one product over the leaves and the nesting to rebuild each dict from.
+    # Anything needing to combine values (a leaf set twice, or a finalized dict merged into) isn't
+    # compiled, so it keeps going through cdict_combine and fails or resolves the same way.
+    def __init__(self) -> None:
+        self.axes: list[Sequence[Any]] = []
+        self.root = _grid_node()
+        # nodes by their path, and whether one has been reached before
+        self._nodes: dict[Tuple[Any, ...], _grid_node] = {}
+
+    def add(self, c: Any, path: Tuple[Any, ...]) -> bool:
+        if isinstance(c, _cdict_product):
+            return all(self.add(f, path) for f in c._items)
+        if not isinstance(c, cdict_dict):
+            return False
+        node = self._nodes.get(path)
+        if node is None:
+            node = self.root if not path else _grid_node()
+            self._nodes[path] = node
+        elif node.final:
+            return False
+        node.final = c._final
+        for k, v in c._item.items():
+            sub = node.entries.get(k)
+            if isinstance(v, (cdict_dict, _cdict_product)):
+                if isinstance(sub, int):
+                    return False
+                if sub is None:
+                    sub = node.entries[k] = _grid_node()
+                    self._nodes[path + (k,)] = sub
+                if not self.add(v, path + (k,)):
+                    return False
+                continue
+            vs = _leaf_values(v)
+            if sub is not None or vs is None:
+                return False
+            node.entries[k] = len(self.axes)
+            self.axes.append(vs)
+        return True
+
+    def small(self) -> bool:
+        # itertools.product keeps a copy of every axis, so only iterate it for axes no bigger than a replay keeps
+        return all(len(vs) <= _REPLAY_LIMIT for vs in self.axes)
+
+    def plain_axes(self) -> Optional[list[Axis]]:
+        # the path and values of every leaf, if all the values are plain and no nested dict is empty
+        # (which no axis would rebuild)
+        paths: list[Tuple[Any, ...]] = [()] * len(self.axes)
+        for path, node in self._nodes.items():
+            if path and not node.entries:
+                return None
+            for k, j in node.entries.items():
+                if isinstance(j, int):
+                    paths[j] = path + (k,)
+        if not all(isinstance(vs, range) or all(_is_plain(x) for x in vs) for vs in self.axes):
+            return None
+        return list(zip(paths, self.axes))
+
+    def deps(self, node: _grid_node) -> list[int]:
+        # the axes that the dict at node (including the ones nested in it) takes values from
+        out: list[int] = []
+        for j in node.entries.values():
+            out.extend([j] if isinstance(j, int) else self.deps(j))
+        return out
+
+    def values(self) -> Iterator[_cdict_value]:
+        # Nested dicts are reused while the leaves they take are the same objects, as when a
+        # product replays them, so a nested dict not depending on the fastest varying axes isn't
+        # rebuilt for every value, and is the same cdict value in all of them.
+        last: dict[int, Tuple[list[Any], _cdict_value]] = {}
+        deps = {id(node): self.deps(node) for node in self._nodes.values()}
+
+        def value(node: _grid_node, vs: Tuple[Any, ...]) -> _cdict_value:
+            d = {k: vs[j] if type(j) is int else nested(cast("_grid_node", j), vs) for k, j in node.entries.items()}
+            return _cdict_value(d, final=node.final)
+
+        def nested(node: _grid_node, vs: Tuple[Any, ...]) -> _cdict_value:
+            key = [vs[j] for j in deps[id(node)]]
+            prev = last.get(id(node))
+            if prev is not None and all(map(operator.is_, prev[0], key)):
+                return prev[1]
+            x = value(node, vs)
+            last[id(node)] = (key, x)
+            return x
+
+        root = self.root
+        return (value(root, vs) for vs in itertools.product(*self.axes))
+
+    def items(self) -> Iterator[AnyDict]:
+        # unwrap values once, as the dicts are built, rather than wrapping them in cdict values first
+        convert = [j for j, vs in enumerate(self.axes) if not all(_item_kind(type(x)) == _PLAIN for x in vs)]
+        build = self._items
+        root = self.root
+        if not convert:
+            return (build(root, vs) for vs in itertools.product(*self.axes))
+        return (build(root, _convert(vs, convert)) for vs in itertools.product(*self.axes))
+
+    def _items(self, node: _grid_node, vs: Sequence[Any]) -> AnyDict:
+        build = self._items
+        return {k: vs[j] if type(j) is int else build(cast("_grid_node", j), vs) for k, j in node.entries.items()}
+
+
+def _convert(vs: Tuple[Any, ...], convert: list[int]) -> list[Any]:
+    out = list(vs)
+    for j in convert:
+        out[j] = recursive_cdict_item(out[j])
+    return out
+
+
+def _compile(c: cdict_base) -> Optional[_grid]:
+    grid = _grid()
+    return grid if grid.add(c, ()) else None
+
+
+def _item_reiterable(d: Any) -> bool:
+    if isinstance(d, cdict_base):
+        return d._reiterable()
+    return not hasattr(d, "cdict_iter")
+
+
 def _iter_values(d: Any) -> Generator[Any, None, None]:
     if hasattr(d, "cdict_iter"):
         for x in d.cdict_iter():
@@ -124,20 +688,224 @@ def _iter_values(d: Any) -> Generator[Any, None, None]:
         yield d
 
 
+class _replay():
+    # Re-iterable view of the values of d.  The first pass is cached so later passes replay it,
+    # unless it grows past the limit and d can be re-iterated, in which case later passes do that.
+    def __init__(self, d: Any, limit: int) -> None:
+        self._d = d
+        self._reiterable = _item_reiterable(d)
+        self._limit = limit
+        self._cache: Optional[list[Any]] = []
+        self._it: Optional[Iterator[Any]] = None
+        self._done = False
+
+    def __iter__(self) -> Iterator[Any]:
+        cache = self._cache
+        if cache is None:
+            yield from _iter_values(self._d)
+            return
+        i = 0
+        while True:
+            if i < len(cache):
+                yield cache[i]
+                i += 1
+                continue
+            if self._done:
+                return
+            if self._it is None:
+                self._it = _iter_values(self._d)
+            try:
+                x = next(self._it)
+            except StopIteration:
+                self._done = True
+                self._it = None
+                return
+            if self._reiterable and len(cache) >= self._limit:
+                # stop caching, finish this pass from the live iterator
+                it = self._it
+                self._cache = None
+                self._it = None
+                yield x
+                yield from it
+                return
+            cache.append(x)
+
+
+def _replayable(d: Any) -> Iterable[Any]:
+    if not isinstance(d, cdict_base) and not hasattr(d, "cdict_iter"):
+        return (d,)
+    return _replay(d, _REPLAY_LIMIT)
+
+
+def _product(
+    parts: Sequence[Iterable[Any]], firsts: Optional[Sequence[Iterable[Any]]] = None,
+) -> Generator[Tuple[Any, ...], None, None]:
+    # Like itertools.product, but streaming: parts are read lazily rather than stored up front,
+    # so all parts but the first must be re-iterable.  To start part way through, firsts gives
+    # what to iterate instead of each part the first time it's reached.
+    n = len(parts)
+    if n == 0:
+        yield ()
+        return
+    vals: list[Any] = [None] * n
+    pending = list(firsts) if firsts is not None else None
+    its = [iter(parts[0] if pending is None else pending[0])]
+    while its:
+        j = len(its) - 1
+        try:
+            vals[j] = next(its[j])
+        except StopIteration:
+            its.pop()
+            continue
+        if pending is not None and j == n - 1:
+            pending = None
+        if j == n - 1:
+            yield tuple(vals)
+        elif j == n - 2:
+            # fast path for the innermost part
+            last = parts[n - 1] if pending is None else pending[n - 1]
+            pending = None
+            for vals[n - 1] in last:
+                yield tuple(vals)
+        else:
+            its.append(iter(parts[j + 1] if pending is None else pending[j + 1]))
+
+
 class cdict_iter(cdict_base):
     def __init__(self, _items: Iterable[Any]) -> None:
         self._items = _items
+        self._offsets_cache: Optional[list[int]] = None
+        # whether every item yields exactly one value, so offsets are just indices
+        self._single_values = False
 
     def cdict_iter(self) -> Generator[_cdict_value, None, None]:
-        for d in iter(self._items):
-            print('d', d)
-            yield from _iter_values(d)
+        # walk nested concatenations with an explicit stack, so deep nesting doesn't recurse
+        stack = [iter(self._parts)]
+        while stack:
+            for d in stack[-1]:
+                if type(d) is cdict_iter:
+                    stack.append(iter(d._items))
+                    break
+                if isinstance(d, cdict_base) or hasattr(d, "cdict_iter"):
+                    yield from _iter_values(d)
+                else:
+                    yield d
+            else:
+                stack.pop()
+
+    @functools.cached_property
+    def _parts(self) -> Iterable[Any]:
+        # The items, with those of nested concatenations spliced in.  + builds sums one part at a
+        # time into chains as deep as the number of parts, so this walks them with a stack.
+        if not isinstance(self._items, tuple):
+            return self._items
+        parts: list[Any] = []
+        stack = [iter(self._items)]
+        while stack:
+            for d in stack[-1]:
+                if type(d) is cdict_iter and isinstance(d._items, tuple):
+                    if "_parts" in d.__dict__:
+                        parts.extend(d._parts)
+                    else:
+                        stack.append(iter(d._items))
+                        break
+                else:
+                    parts.append(d)
+            else:
+                stack.pop()
+        return tuple(parts)
+
+    def _offsets(self) -> Optional[list[int]]:
+        # offsets[j] is the index of the first value coming from self._parts[j]
+        if self._offsets_cache is None:
+            if not isinstance(self._parts, (list, tuple)):
+                # arbitrary iterables (e.g. generators) can only be counted by consuming them
+                return None
+            offsets = [0]
+            for d in self._parts:
+                m = _item_len(d)
+                if m is None:
+                    return None
+                offsets.append(offsets[-1] + m)
+            self._offsets_cache = offsets
+            self._single_values = offsets[-1] == len(self._parts) and all(_item_len(d) == 1 for d in self._parts)
+        return self._offsets_cache
+
+    def _len(self) -> Optional[int]:
+        if isinstance(self._parts, range):
+            return len(self._parts)
+        offsets = self._offsets()
+        return None if offsets is None else offsets[-1]
+
+    def _reiterable(self) -> bool:
+        if isinstance(self._parts, collections.abc.Iterator):
+            return False
+        return all(_item_reiterable(d) for d in self._parts)
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        if not isinstance(self._parts, (list, tuple)):
+            return None
+        return _union_keys(self._parts)
+
+    def _get(self, i: int) -> Any:
+        items = cast("Sequence[Any]", self._parts)
+        if isinstance(items, range):
+            return items[i]
+        offsets = cast("list[int]", self._offsets())
+        if self._single_values:
+            return _item_get(items[i], 0)
+        # rightmost part starting at or before i, which skips over empty parts
+        j = bisect.bisect_right(offsets, i) - 1
+        return _item_get(items[j], i - offsets[j])
+
+    def _iter_from(self, i: int) -> Iterator[Any]:
+        if isinstance(self._parts, range):
+            return iter(self._parts[i:])
+        offsets = self._offsets()
+        if offsets is None:
+            return super()._iter_from(i)
+        items = cast("Sequence[Any]", self._parts)
+        j = bisect.bisect_right(offsets, i) - 1
+        if j == len(items):
+            return iter(())
+        return itertools.chain(_item_iter_from(items[j], i - offsets[j]), cdict_iter(tuple(items[j + 1:])).cdict_iter())
+
+    def _cursor_iter(self, cursor: Any) -> Iterator[Tuple[Any, Any, Any]]:
+        if self._len() is not None or not isinstance(self._parts, (list, tuple)):
+            yield from super()._cursor_iter(cursor)
+            return
+        # the index of the current part, and the cursor within it
+        j, sub = cursor or (0, None)
+        for j in range(j, len(self._parts)):
+            d = self._parts[j]
+            if isinstance(d, cdict_base):
+                for x, before, after in d._cursor_iter(sub):
+                    yield x, [j, before], [j, after]
+            else:
+                start = sub or 0
+                for k, x in enumerate(itertools.islice(_iter_values(d), start, None), start):
+                    yield x, [j, k], [j, k + 1]
+            sub = None
+
+    def _len_bound(self) -> Optional[int]:
+        if not isinstance(self._parts, (list, tuple)):
+            return self._len()
+        bounds = [_item_len_bound(d) for d in self._parts]
+        return None if None in bounds else sum(cast("list[int]", bounds))
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        if not isinstance(self._parts, (list, tuple)):
+            return []
+        return [("", d) for d in self._parts if isinstance(d, cdict_base)]
+
+    def _label(self) -> str:
+        return "+" if self._children() else repr(self)
 
     def __repr__(self) -> str:
-        if isinstance(self._items, (list, tuple)):
-            return "clist(" + ", ".join(str(d) for d in self._items) + ")"
+        if isinstance(self._parts, (list, tuple)):
+            return "clist(" + ", ".join(str(d) for d in self._parts) + ")"
         else:
-            return "citer(" + str(self._items) + ")"
+            return "citer(" + str(self._parts) + ")"
 
 
 class cdict_dict(cdict_base):
@@ -146,24 +914,180 @@ class cdict_dict(cdict_base):
         self._final = final
 
     def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        d = self._item
+        ks = list(d.keys())
+        final = self._final
+        axes = [_leaf_values(v) for v in d.values()]
+        if None not in axes and all(len(vs) <= _REPLAY_LIMIT for vs in cast("list[Sequence[Any]]", axes)):
+            # all leaves, so a plain product (nested dicts are cheaper to replay than to rebuild)
+            for vs in itertools.product(*cast("list[Sequence[Any]]", axes)):
+                yield _cdict_value(dict(zip(ks, vs)), final=final)
+            return
         # combinatorially yield
+        parts = [_iter_values(d[k]) if j == 0 else _replayable(d[k]) for j, k in enumerate(ks)]
+        for vs in _product(parts):
+            yield _cdict_value(dict(zip(ks, vs)), final=final)
+
+    @functools.cached_property
+    def _value_lens(self) -> Optional[list[int]]:
+        lens = []
+        for v in self._item.values():
+            m = _item_len(v)
+            if m is None:
+                return None
+            lens.append(m)
+        return lens
+
+    def _len(self) -> Optional[int]:
+        lens = self._value_lens
+        return None if lens is None else math.prod(lens)
+
+    def _reiterable(self) -> bool:
+        return all(_item_reiterable(v) for v in self._item.values())
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return frozenset(self._item)
+
+    def _radices(self) -> Optional[list[int]]:
+        radices: list[int] = []
+        for v in self._item.values():
+            if isinstance(v, cdict_base):
+                sub = v._radices()
+                if sub is None:
+                    return None
+                radices.extend(sub)
+            elif hasattr(v, "cdict_iter"):
+                return None
+        return radices
+
+    def _get(self, i: int) -> Any:
+        # itertools.product varies the last key fastest, so decode i in mixed radix from the right
+        vs = []
+        for v, n in zip(reversed(self._item.values()), reversed(cast("list[int]", self._value_lens))):
+            i, r = divmod(i, n)
+            vs.append(_item_get(v, r))
+        return _cdict_value(dict(zip(self._item.keys(), reversed(vs))), final=self._final)
+
+    def _iter_from(self, i: int) -> Iterator[Any]:
+        lens = self._value_lens
+        if lens is None:
+            return super()._iter_from(i)
+        if i >= math.prod(lens):
+            return iter(())
         d = self._item
         ks = list(d.keys())
-        for vs in itertools.product(*(_iter_values(d[k]) for k in ks)):
-            d = {k: v for k, v in zip(ks, vs)}
-            yield _cdict_value(d, final=self._final)
+        parts = [() if j == 0 else _replayable(d[k]) for j, k in enumerate(ks)]
+        firsts = [_item_iter_from(v, r) for v, r in zip(d.values(), _digits(i, lens))]
+        final = self._final
+        return (_cdict_value(dict(zip(ks, vs)), final=final) for vs in _product(parts, firsts))
+
+    def _len_bound(self) -> Optional[int]:
+        return _bounds_prod(_item_len_bound(v) for v in self._item.values())
+
+    @functools.cached_property
+    def _compiled(self) -> Optional[_grid]:
+        return _compile(self)
+
+    def _grid(self) -> Optional[_grid]:
+        return self._compiled
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [(f"{k}=", v) for k, v in self._item.items() if isinstance(v, cdict_base)]
+
+    def _label(self) -> str:
+        return "cdict(" + ", ".join([f"{k}={'...' if isinstance(v, cdict_base) else v}" for k, v in self._item.items()]) + ")"
 
     def __repr__(self) -> str:
         return "cdict(" + ", ".join([f"{k}={v}" for k, v in self._item.items()]) + ")"
 
 
+def _apply_chunk(fn: Callable[[Any], Any], raw: bool, xs: list[Any]) -> list[list[Any]]:
+    # runs on an executor, so it has to be picklable and return everything fn yields
+    if raw:
+        return [list(fn(x)) for x in xs]
+    return [list(fn(recursive_cdict_item(x))) for x in xs]
+
+
 class _cdict_apply(cdict_base):
-    def __init__(self, fn: Callable[[Any], Any], _inner: cdict_base, raw: bool = False) -> None:
+    def __init__(
+        self, fn: Callable[[Any], Any], _inner: cdict_base, raw: bool = False,
+        executor: Optional[concurrent.futures.Executor] = None, chunksize: int = 1, ordered: bool = True,
+        concurrency: Optional[int] = None, window: Optional[int] = None,
+    ) -> None:
+        # with concurrency, fn is async and up to that many calls run at once, and with an executor,
+        # up to window chunks are in flight at once
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be positive, got {chunksize}")
+        if window is not None and window < 1:
+            raise ValueError(f"window must be positive, got {window}")
+        if concurrency is not None and concurrency < 1:
+            raise ValueError(f"concurrency must be positive, got {concurrency}")
+        if concurrency is not None and executor is not None:
+            raise ValueError("Async apply functions run on an event loop, not an executor")
         self._inner = _inner
         self._fn = fn
         self.raw = raw
+        self._executor = executor
+        self._chunksize = chunksize
+        self._ordered = ordered
+        self._concurrency = concurrency
+        self._window = window
+
+    def _result(self, v: Any) -> _cdict_value:
+        if not self.raw:
+            return _cdict_value(v)
+        if not isinstance(v, _cdict_value):
+            raise ValueError(f"Raw apply function must return cdict values, got {v}")
+        return v
+
+    def _results(self, results: list[list[Any]]) -> Generator[_cdict_value, None, None]:
+        for vs in results:
+            for v in vs:
+                yield self._result(v)
+
+    def _parallel_iter(self, executor: Any, window: int) -> Generator[_cdict_value, None, None]:
+        # keep a bounded number of chunks in flight, so that huge or infinite sweeps stay in constant memory
+        it = self._inner.cdict_iter()
+        chunks = iter(lambda: list(itertools.islice(it, self._chunksize)), [])
+        pending: collections.deque[concurrent.futures.Future[list[list[Any]]]] = collections.deque()
+        if self._concurrency is not None:
+            from .aio import _aapply_chunk
+            apply_chunk: Callable[..., Any] = _aapply_chunk
+        else:
+            apply_chunk = _apply_chunk
+        try:
+            for chunk in chunks:
+                if len(pending) >= window:
+                    yield from self._results(self._next_done(pending))
+                pending.append(executor.submit(apply_chunk, self._fn, self.raw, chunk))
+            while pending:
+                yield from self._results(self._next_done(pending))
+        finally:
+            for f in pending:
+                f.cancel()
+
+    def _next_done(self, pending: collections.deque[concurrent.futures.Future[list[list[Any]]]]) -> list[list[Any]]:
+        if self._ordered:
+            return pending.popleft().result()
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        f = next(iter(done))
+        pending.remove(f)
+        return f.result()
 
     def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        if self._concurrency is not None:
+            # iterated synchronously, e.g. as part of a product, so run the calls on a loop of its own
+            from .aio import _loop_thread
+            loop = _loop_thread(self._concurrency)
+            try:
+                yield from self._parallel_iter(loop, self._window or 2 * self._concurrency)
+            finally:
+                loop.shutdown()
+            return
+        if self._executor is not None:
+            # a couple of chunks per core by default, enough to keep workers busy
+            yield from self._parallel_iter(self._executor, self._window or 2 * (os.cpu_count() or 1))
+            return
         for x in self._inner.cdict_iter():
             if self.raw:
                 # this version respects finalize, gives user control over that
@@ -177,24 +1101,247 @@ class _cdict_apply(cdict_base):
                 for v in self._fn(recursive_cdict_item(x)):
                     yield _cdict_value(v)
 
+    def _cursor_iter(self, cursor: Any) -> Iterator[Tuple[Any, Any, Any]]:
+        # the cursor of the inner cdict at the current value, and how many results of fn on it were yielded;
+        # resuming runs fn again on that one value, but not on any before it
+        inner, skip = cursor or (None, 0)
+        if self._concurrency is not None:
+            from .aio import _aapply_chunk, _loop_thread
+            loop = _loop_thread(1)
+        try:
+            for x, before, after in self._inner._cursor_iter(inner):
+                if self._concurrency is not None:
+                    vs = loop.submit(_aapply_chunk, self._fn, self.raw, [x]).result()[0]
+                else:
+                    vs = self._fn(x) if self.raw else self._fn(recursive_cdict_item(x))
+                for k, v in enumerate(itertools.islice(vs, skip, None), skip):
+                    yield self._result(v), [before, k], [before, k + 1]
+                skip = 0
+        finally:
+            if self._concurrency is not None:
+                loop.shutdown()
+
+    def _acdict_iter(self) -> AsyncIterator[Any]:
+        if self._concurrency is None:
+            return super()._acdict_iter()
+        from .aio import apply_values
+        return apply_values(self)
+
+    def _reiterable(self) -> bool:
+        return self._inner._reiterable()
+
+    def _len_bound(self) -> Optional[int]:
+        # filters yield at most one value per value
+        if isinstance(self._fn, (_keep_fn, _filter_fn)):
+            return self._inner._len_bound()
+        return None
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._inner)]
+
+    def _label(self) -> str:
+        return f".apply({self._fn})"
+
     def __repr__(self) -> str:
         return f"{self._inner}.apply({self._fn})"
 
 
+def _yield_fn(x: Any) -> Any:
+    yield x
+
+
+class _map_fn():
+    # apply function yielding fn of each value, a class rather than a closure so process pools can pickle it
+    def __init__(self, fn: Callable[[Any], Any]) -> None:
+        self._fn = fn
+
+    def __call__(self, x: Any) -> Any:
+        yield self._fn(x)
+
+    def __repr__(self) -> str:
+        return f"map({self._fn})"
+
+
+class _keep_fn():
+    # apply function yielding the values that pass fn
+    def __init__(self, fn: Callable[[Any], bool]) -> None:
+        self._fn = fn
+
+    def __call__(self, x: Any) -> Any:
+        if self._fn(x):
+            yield x
+
+    def __repr__(self) -> str:
+        return f"filter({self._fn})"
+
+
+class _filter_fn():
+    # raw apply function keeping the cdict values that pass fn
+    def __init__(self, fn: Callable[[Any], bool], raw: bool) -> None:
+        self._fn = fn
+        self._raw = raw
+
+    def __call__(self, x: Any) -> Any:
+        if self._fn(x if self._raw else recursive_cdict_item(x)):
+            yield x
+
+    def __repr__(self) -> str:
+        return f"filter({self._fn})"
+
+
+def _push_filter(c: cdict_base, fn: _filter_fn, keys: frozenset[Any], **pool: Any) -> cdict_base:
+    # Filter c with fn, which only depends on keys, applying it to the smallest parts of c that
+    # determine those keys, so that rejected values never get combined with the rest of c.
+    # pool holds the executor arguments for _cdict_apply.
+    ks = c._keys()
+    if ks is None or not keys <= ks:
+        return _cdict_apply(fn, c, raw=True, **pool)
+    if type(c) is cdict_iter and isinstance(c._parts, (list, tuple)):
+        if all(isinstance(d, cdict_base) for d in c._parts):
+            # filtering distributes over +
+            return cdict_iter(tuple(_push_filter(d, fn, keys, **pool) for d in c._parts))
+    elif isinstance(c, _cdict_product):
+        owners = [j for j, f in enumerate(c._items) if cast("frozenset[Any]", f._keys()) & keys]
+        if len(owners) == 1:
+            # a single factor produces all the keys, so their values can't change when combined
+            j = owners[0]
+            return _cdict_product(*c._items[:j], _push_filter(c._items[j], fn, keys, **pool), *c._items[j + 1:])
+        # the keys are settled once the last factor producing them is combined, so filter that prefix
+        j = owners[-1] if owners else 0
+        if j < len(c._items) - 1:
+            prefix = _cdict_product(*c._items[:j + 1])
+            return _cdict_product(_cdict_apply(fn, prefix, raw=True, **pool), *c._items[j + 1:])
+    elif isinstance(c, cdict_dict):
+        # same for a prefix of the keys, splitting the dict into a product
+        ks_list = list(c._item)
+        j = max(ks_list.index(k) for k in keys) if keys else 0
+        if j < len(ks_list) - 1:
+            first = cdict_dict({k: c._item[k] for k in ks_list[:j + 1]})
+            rest = cdict_dict({k: c._item[k] for k in ks_list[j + 1:]}, final=c._final)
+            return _cdict_product(_cdict_apply(fn, first, raw=True, **pool), rest)
+    return _cdict_apply(fn, c, raw=True, **pool)
+
+
 class _cdict_product(cdict_base):
-    def __init__(self, _item1: Any, _item2: Any) -> None:
-        for c in [_item1, _item2]:
+    def __init__(self, *_items: Any) -> None:
+        for c in _items:
             if not isinstance(c, cdict_base):
                 raise TypeError(f"Cannot multiply non-cdicts: {c}")
-        self._item1 = _item1
-        self._item2 = _item2
+        self._items: Tuple[cdict_base, ...] = _items
+
+    @functools.cached_property
+    def _overlap(self) -> Optional[frozenset[Any]]:
+        # keys that more than one factor can produce, or None if unknown
+        seen: set[Any] = set()
+        overlap: set[Any] = set()
+        for c in self._items:
+            ks = c._keys()
+            if ks is None:
+                return None
+            overlap |= seen & ks
+            seen |= ks
+        return frozenset(overlap)
 
     def cdict_iter(self) -> Generator[_cdict_value, None, None]:
-        for (d1, d2) in itertools.product(self._item1.cdict_iter(), self._item2.cdict_iter()):
-            yield d1.cdict_combine(d2)
+        grid = self._compiled
+        if grid is not None and grid.small():
+            # one product over the leaves, rather than merging the factors' dicts for every value
+            yield from grid.values()
+            return
+        overlap = self._overlap
+        parts = [self._items[0].cdict_iter()] + [_replayable(c) for c in self._items[1:]]
+        for ds in _product(parts):
+            yield _combine_values(ds, overlap)
+
+    def _len(self) -> Optional[int]:
+        n = 1
+        for c in self._items:
+            m = c._len()
+            if m is None:
+                return None
+            n *= m
+        return n
+
+    def _reiterable(self) -> bool:
+        return all(c._reiterable() for c in self._items)
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return _union_keys(self._items)
+
+    def _radices(self) -> Optional[list[int]]:
+        radices: list[int] = []
+        for c in self._items:
+            sub = c._radices()
+            if sub is None:
+                return None
+            radices.extend(sub)
+        return radices
+
+    def _get(self, i: int) -> Any:
+        ds = []
+        for c in reversed(self._items):
+            i, r = divmod(i, cast("int", c._len()))
+            ds.append(c._get(r))
+        return _combine_values(ds[::-1], self._overlap)
+
+    def _iter_from(self, i: int) -> Iterator[Any]:
+        n = self._len()
+        if n is None:
+            return super()._iter_from(i)
+        if i >= n:
+            return iter(())
+        lens = [cast("int", c._len()) for c in self._items]
+        overlap = self._overlap
+        parts = [()] + [_replayable(c) for c in self._items[1:]]
+        firsts = [c._iter_from(r) for c, r in zip(self._items, _digits(i, lens))]
+        return (_combine_values(ds, overlap) for ds in _product(parts, firsts))
+
+    def _cursor_iter(self, cursor: Any) -> Iterator[Tuple[Any, Any, Any]]:
+        # Cursors into the factors need to iterate every factor but the first again for each value
+        # of the first, which one-shot factors can't, and resuming would have skipped past the
+        # values they'd need to replay, so then count values instead
+        if self._len() is not None or not all(c._reiterable() for c in self._items[1:]):
+            return super()._cursor_iter(cursor)
+        overlap = self._overlap
+        cursor = cursor or [None] * len(self._items)
+        return ((_combine_values(ds, overlap), bs, cs) for ds, bs, cs in _cursor_product(self._items, cursor))
+
+    def _len_bound(self) -> Optional[int]:
+        return _bounds_prod(c._len_bound() for c in self._items)
+
+    @functools.cached_property
+    def _compiled(self) -> Optional[_grid]:
+        return _compile(self)
+
+    def _grid(self) -> Optional[_grid]:
+        return self._compiled
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", c) for c in self._items]
+
+    def _label(self) -> str:
+        return "*"
 
     def __repr__(self) -> str:
-        return " * ".join([str(d) for d in [self._item1, self._item2]])
+        return " * ".join([str(d) for d in self._items])
+
+
+def _cursor_product(
+    items: Sequence[cdict_base], cursor: list[Any],
+) -> Generator[Tuple[list[Any], list[Any], list[Any]], None, None]:
+    # Values of the product of items, with cursors at and after them.  A cursor has an entry per
+    # item, which for the last is its cursor at or after its current value, and for the others
+    # the cursor at their current value, so that resuming yields it again to combine with the rest.
+    first, rest = items[0], items[1:]
+    if not rest:
+        for x, before, after in first._cursor_iter(cursor[0]):
+            yield [x], [before], [after]
+        return
+    rest_cursor = cursor[1:]
+    for x, at, _ in first._cursor_iter(cursor[0]):
+        for xs, bs, cs in _cursor_product(rest, rest_cursor):
+            yield [x] + xs, [at] + bs, [at] + cs
+        rest_cursor = [None] * len(rest)
 
 
 def _safe_zip(*iterables: Iterable[Any]) -> Generator[Tuple[Any], None, None]:
@@ -213,5 +1360,297 @@ class _cdict_zip(cdict_base):
         for ds in _safe_zip(*[it.cdict_iter() for it in self._items]):
             yield _cdict_value(_combine_dicts(ds))
 
+    def _len(self) -> Optional[int]:
+        ns = []
+        for it in self._items:
+            n = it._len()
+            if n is None:
+                return None
+            ns.append(n)
+        if len(set(ns)) > 1:
+            # not a size, iterating fails once the shortest runs out
+            return None
+        return ns[0] if ns else 0
+
+    def _reiterable(self) -> bool:
+        return all(it._reiterable() for it in self._items)
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return _union_keys(self._items)
+
+    def _get(self, i: int) -> Any:
+        return _cdict_value(_combine_dicts([it._get(i) for it in self._items]))
+
+    def _cursor_iter(self, cursor: Any) -> Iterator[Tuple[Any, Any, Any]]:
+        if self._len() is not None:
+            yield from super()._cursor_iter(cursor)
+            return
+        # a cursor per zipped cdict
+        cursor = cursor or [None] * len(self._items)
+        for xs in _safe_zip(*[it._cursor_iter(c) for it, c in zip(self._items, cursor)]):
+            yield _cdict_value(_combine_dicts([x for x, _, _ in xs])), [b for _, b, _ in xs], [a for _, _, a in xs]
+
+    def _len_bound(self) -> Optional[int]:
+        bounds = [c._len_bound() for c in self._items]
+        known = [b for b in bounds if b is not None]
+        return min(known) if known else None
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", c) for c in self._items]
+
+    def _label(self) -> str:
+        return "|"
+
     def __repr__(self) -> str:
         return " | ".join([str(d) for d in self._items])
+
+
+class _cdict_slice(cdict_base):
+    def __init__(self, _inner: cdict_base, _slice: slice) -> None:
+        if _slice.step == 0:
+            raise ValueError("slice step cannot be zero")
+        self._inner = _inner
+        self._slice = _slice
+        self._range_cache: Optional[range] = None
+
+    def _range(self) -> Optional[range]:
+        # indices into the inner cdict, if its length is known
+        if self._range_cache is None:
+            n = self._inner._len()
+            if n is None:
+                return None
+            self._range_cache = range(n)[self._slice]
+        return self._range_cache
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        r = self._range()
+        if r is not None:
+            if r.step == 1:
+                # contiguous, so the inner cdict can iterate rather than index each value
+                yield from itertools.islice(self._inner._iter_from(r.start), len(r))
+                return
+            for i in r:
+                yield self._inner._get(i)
+            return
+        start, stop, step = self._slice.start, self._slice.stop, self._slice.step
+        if any(x is not None and x < 0 for x in (start, stop, step)):
+            # relative to the end, which is only known after iterating everything
+            yield from list(self._inner.cdict_iter())[self._slice]
+        else:
+            yield from itertools.islice(self._inner.cdict_iter(), start, stop, step)
+
+    def _len(self) -> Optional[int]:
+        r = self._range()
+        return None if r is None else len(r)
+
+    def _reiterable(self) -> bool:
+        return self._inner._reiterable()
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return self._inner._keys()
+
+    def _get(self, i: int) -> Any:
+        return self._inner._get(cast("range", self._range())[i])
+
+    def _len_bound(self) -> Optional[int]:
+        n = self._len()
+        if n is not None:
+            return n
+        s = self._slice
+        bound = self._inner._len_bound()
+        if any(x is not None and x < 0 for x in (s.start, s.stop, s.step)):
+            return bound
+        if bound is None:
+            bound = s.stop
+        return None if bound is None else len(range(bound)[s])
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._inner)]
+
+    def _label(self) -> str:
+        s = self._slice
+        parts = ["" if x is None else str(x) for x in (s.start, s.stop, s.step)]
+        return "[" + ":".join(parts if s.step is not None else parts[:2]) + "]"
+
+    def __repr__(self) -> str:
+        return f"({self._inner}){self._label()}"
+
+
+class _cdict_buffered_shard(cdict_base):
+    # a contiguous shard of a one-shot cdict of unknown size, which has to be read in full to count it
+    def __init__(self, _inner: cdict_base, k: int, n: int) -> None:
+        self._inner = _inner
+        self._k = k
+        self._n = n
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        xs = list(self._inner.cdict_iter())
+        size = len(xs)
+        yield from xs[self._k * size // self._n:(self._k + 1) * size // self._n]
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return self._inner._keys()
+
+    def _len_bound(self) -> Optional[int]:
+        return self._inner._len_bound()
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._inner)]
+
+    def _label(self) -> str:
+        return f"shard({self._k}, {self._n})"
+
+    def __repr__(self) -> str:
+        return f"({self._inner}).{self._label()}"
+
+
+class _bloom():
+    # fixed size Bloom filter, hashing with double hashing over two 64-bit hashes
+    def __init__(self, max_bytes: int, hashes: int = 7) -> None:
+        self._bits = bytearray(max_bytes)
+        self._m = 8 * max_bytes
+        self._k = hashes
+
+    def add(self, x: Any) -> bool:
+        # adds x, returning whether it was (probably) already present
+        h1, h2 = hash(x), hash((x, _bloom))
+        present = True
+        for i in range(self._k):
+            j = (h1 + i * h2) % self._m
+            byte, bit = j >> 3, 1 << (j & 7)
+            if not self._bits[byte] & bit:
+                present = False
+                self._bits[byte] |= bit
+        return present
+
+
+class _cdict_distinct(cdict_base):
+    def __init__(self, _inner: cdict_base, approx: bool = False, max_bytes: int = 1 << 24) -> None:
+        self._inner = _inner
+        self._approx = approx
+        self._max_bytes = max_bytes
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        # compares the cdict values before they're unwrapped into dicts
+        if self._approx:
+            # may drop a few distinct values, but never uses more than max_bytes
+            bloom = _bloom(self._max_bytes)
+            for x in self._inner.cdict_iter():
+                if not bloom.add(_canonical(x)):
+                    yield x
+        else:
+            seen: set[Any] = set()
+            for x in self._inner.cdict_iter():
+                key = _canonical(x)
+                if key not in seen:
+                    seen.add(key)
+                    yield x
+
+    def _reiterable(self) -> bool:
+        return self._inner._reiterable()
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return self._inner._keys()
+
+    def _len_bound(self) -> Optional[int]:
+        return self._inner._len_bound()
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._inner)]
+
+    def _label(self) -> str:
+        return ".distinct()"
+
+    def __repr__(self) -> str:
+        return f"({self._inner}).distinct()"
+
+
+class _cdict_sample(cdict_base):
+    def __init__(self, _inner: cdict_base, k: int, seed: Optional[int] = None, method: str = "uniform") -> None:
+        if k < 0:
+            raise ValueError("Sample size must be non-negative")
+        if method not in ("uniform", "lhs", "sobol", "stratified"):
+            raise ValueError(f"Unknown sampling method {method!r}, expected 'uniform', 'lhs', 'sobol' or 'stratified'")
+        self._inner = _inner
+        self._k = k
+        self._method = method
+        # fix the seed, so that iterating again gives the same sample
+        self._seed = random.randrange(1 << 64) if seed is None else seed
+        self._indices_cache: Optional[list[int]] = None
+
+    def _indices(self) -> Optional[list[int]]:
+        # sorted indices of the sample into the inner cdict, if it's indexable
+        if self._indices_cache is None:
+            n = self._inner._len()
+            if n is None:
+                if self._method != "uniform":
+                    raise TypeError(f"{self._method} sampling needs an indexable cdict, {self._inner} is not")
+                return None
+            rng = random.Random(self._seed)
+            if self._method == "uniform":
+                self._indices_cache = sorted(rng.sample(range(n), self._k))
+            else:
+                self._indices_cache = sorted(self._space_filling_indices(n, rng))
+        return self._indices_cache
+
+    def _space_filling_indices(self, n: int, rng: random.Random) -> list[int]:
+        # spread the sample over the dimensions of the inner cdict's index (e.g. the keys of a cdict_dict)
+        from .sampling import digits
+        if self._k > n:
+            raise ValueError("Sample larger than population")
+        sizes = [r for r in cast("list[int]", self._inner._radices()) if r > 1]
+        indices: dict[int, None] = {}
+        for ds in digits(self._method, sizes, self._k, rng):
+            i = 0
+            for d, size in zip(ds, sizes):
+                i = i * size + d
+            indices[i] = None
+        # points can coincide when some dimensions are smaller than k, top those up uniformly
+        while len(indices) < self._k:
+            indices[rng.randrange(n)] = None
+        return list(indices)
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        indices = self._indices()
+        if indices is not None:
+            for i in indices:
+                yield self._inner._get(i)
+            return
+        # not indexable, so reservoir sample in a single pass
+        rng = random.Random(self._seed)
+        reservoir: list[Tuple[int, Any]] = []
+        n = 0
+        for n, x in enumerate(self._inner.cdict_iter(), 1):
+            if n <= self._k:
+                reservoir.append((n, x))
+            else:
+                j = rng.randrange(n)
+                if j < self._k:
+                    reservoir[j] = (n, x)
+        if n < self._k:
+            raise ValueError("Sample larger than population")
+        reservoir.sort(key=lambda t: t[0])
+        for _, x in reservoir:
+            yield x
+
+    def _len(self) -> Optional[int]:
+        indices = self._indices()
+        return None if indices is None else len(indices)
+
+    def _reiterable(self) -> bool:
+        return self._inner._reiterable()
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return self._inner._keys()
+
+    def _get(self, i: int) -> Any:
+        return self._inner._get(cast("list[int]", self._indices())[i])
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._inner)]
+
+    def _label(self) -> str:
+        return f".sample({self._k}, seed={self._seed}, method={self._method!r})"
+
+    def __repr__(self) -> str:
+        return f"({self._inner}){self._label()}"
@@ -0,0 +1,106 @@
+from __future__ import annotations
+from typing import Any, Generator, Optional, Sequence, Tuple
+
+from .core import cdict_base, cdict_dict, cdict_iter, _canonical, _cdict_value, _concat, _grid, _grid_node, _replayable
+
+
+class _cdict_difference(cdict_base):
+    # the values of a that aren't values of b, found by hashing all of b and streaming a past it
+    def __init__(self, a: cdict_base, b: cdict_base) -> None:
+        self._a = a
+        self._b = b
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        seen = set(_canonical(x) for x in self._b.cdict_iter())
+        for x in self._a.cdict_iter():
+            if _canonical(x) not in seen:
+                yield x
+
+    def _reiterable(self) -> bool:
+        return self._a._reiterable() and self._b._reiterable()
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return self._a._keys()
+
+    def _len_bound(self) -> Optional[int]:
+        return self._a._len_bound()
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._a), ("- ", self._b)]
+
+    def _label(self) -> str:
+        return "difference"
+
+    def __repr__(self) -> str:
+        return f"({self._a}) - ({self._b})"
+
+
+class _cdict_buffered(cdict_base):
+    # a one-shot cdict kept as it's read, so both sides of a diff can go over it
+    def __init__(self, inner: cdict_base) -> None:
+        self._inner = inner
+        self._values = _replayable(inner)
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        yield from self._values
+
+    def _reiterable(self) -> bool:
+        return True
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return self._inner._keys()
+
+    def _len_bound(self) -> Optional[int]:
+        return self._inner._len_bound()
+
+    def _children(self) -> list[Tuple[str, cdict_base]]:
+        return [("", self._inner)]
+
+    def _label(self) -> str:
+        return "buffered"
+
+    def __repr__(self) -> str:
+        return f"({self._inner}).buffered()"
+
+
+def _shape(node: _grid_node) -> Any:
+    # the nesting of a grid, which has to match for axes of two grids to line up
+    return node.final, tuple((k, j if isinstance(j, int) else _shape(j)) for k, j in node.entries.items())
+
+
+def _rebuild(node: _grid_node, axes: Sequence[Sequence[Any]]) -> cdict_base:
+    # a cdict_dict iterating like the grid would with these axes
+    d: dict[Any, Any] = {}
+    for k, j in node.entries.items():
+        d[k] = cdict_iter(tuple(axes[j])) if isinstance(j, int) else _rebuild(j, axes)
+    return cdict_dict(d, final=node.final)
+
+
+def _new_values(a: _grid, b: _grid) -> cdict_base:
+    # Configs of a that aren't in b, as a disjoint union over the first axis i whose value is new:
+    # axes before i take values in both, axis i values only in a, and axes after i anything in a.
+    # Unchanged axes contribute nothing, so only the slices of the grid that changed get built.
+    olds = [set(_canonical(v) for v in vs) for vs in b.axes]
+    parts = []
+    for i, (vs, old) in enumerate(zip(a.axes, olds)):
+        new = [v for v in vs if _canonical(v) not in old]
+        if not new:
+            continue
+        shared = [[v for v in ws if _canonical(v) in o] for ws, o in zip(a.axes[:i], olds)]
+        parts.append(_rebuild(a.root, shared + [new] + list(a.axes[i + 1:])))
+    return _concat(parts)
+
+
+def diff(old: cdict_base, new: cdict_base) -> Tuple[cdict_base, cdict_base]:
+    # The configs added in new and removed from old.  For grids of the same shape they're worked out
+    # per axis, and come one changed axis at a time rather than in sweep order, otherwise by hashing,
+    # keeping the order of new and old.
+    a, b = new._grid(), old._grid()
+    if a is not None and b is not None and _shape(a.root) == _shape(b.root):
+        return _new_values(a, b), _new_values(b, a)
+    # each result goes over both sides, so one-shot sides are kept for the other
+    if not old._reiterable():
+        old = _cdict_buffered(old)
+    if not new._reiterable():
+        new = _cdict_buffered(new)
+    return _cdict_difference(new, old), _cdict_difference(old, new)
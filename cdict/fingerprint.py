@@ -0,0 +1,100 @@
+from __future__ import annotations
+import hashlib
+import json
+from typing import Any, Generator, Optional, Tuple, TYPE_CHECKING
+
+from .core import _cdict_value, _item_kind, _PLAIN, _REPLAY_LIMIT, recursive_cdict_item
+
+if TYPE_CHECKING:
+    from .core import cdict_base
+
+# A dict hashes to the sum of the hashes of its items, so it doesn't depend on key order, and a
+# merge of dicts with disjoint keys hashes to the sum of their hashes.  Items hash their key
+# together with the hash of their value, and other values hash their canonical JSON.
+_BITS = 128
+_MASK = (1 << _BITS) - 1
+
+
+def _digest(b: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(b, digest_size=_BITS // 8).digest(), "little")
+
+
+def _json(x: Any) -> bytes:
+    return json.dumps(x, sort_keys=True, separators=(",", ":"), default=repr).encode()
+
+
+def _item_hash(k: Any, h: int) -> int:
+    return _digest(_json(k) + b"\0" + h.to_bytes(_BITS // 8, "little"))
+
+
+def _hash(x: Any) -> int:
+    if isinstance(x, dict):
+        return sum(_item_hash(k, _hash(v)) for k, v in x.items()) & _MASK
+    return _digest(_json(x))
+
+
+def fingerprint(cfg: Any) -> str:
+    # stable hash of a config that doesn't depend on key order
+    return f"{_hash(cfg):0{_BITS // 4}x}"
+
+
+class _hasher():
+    # Hashes cdict values the same way as fingerprint hashes what they unwrap to, but caching the
+    # hash on each cdict value and of each scalar leaf, so values shared between configs (e.g. nested
+    # dicts replayed by a product) and repeated leaves are hashed once.  The memos are cleared when
+    # they fill up, so streaming a sweep takes bounded memory.
+    def __init__(self) -> None:
+        self._leaves: dict[Tuple[Any, ...], int] = {}
+        self._items: dict[Tuple[Any, int], int] = {}
+
+    def value(self, x: _cdict_value) -> Tuple[int, bool]:
+        # the hash of x, and whether it can be cached (not if it holds values like lazy, that can unwrap differently)
+        h: Optional[int] = getattr(x, "_hash", None)
+        if h is not None:
+            return h, True
+        total, stable = 0, True
+        for k, v in x.d.items():
+            hv, s = self.item(k, v)
+            total += hv
+            stable = stable and s
+        total &= _MASK
+        if stable:
+            x._hash = total
+        return total, stable
+
+    def item(self, k: Any, v: Any) -> Tuple[int, bool]:
+        t = type(v)
+        if t is _cdict_value:
+            hv, stable = self.value(v)
+            key = (k, hv)
+            h = self._items.get(key)
+            if h is None:
+                if len(self._items) >= _REPLAY_LIMIT:
+                    self._items.clear()
+                h = self._items[key] = _item_hash(k, hv)
+            return h, stable
+        if t in _SCALARS:
+            # repr tells apart values that compare equal but serialize differently, like 0.0 and -0.0
+            leaf_key = (k, repr(v)) if t is float else (k, t, v)
+            h = self._leaves.get(leaf_key)
+            if h is None:
+                if len(self._leaves) >= _REPLAY_LIMIT:
+                    self._leaves.clear()
+                h = self._leaves[leaf_key] = _item_hash(k, _hash(v))
+            return h, True
+        return _item_hash(k, _hash(recursive_cdict_item(v))), _item_kind(t) == _PLAIN
+
+
+# leaf types whose hash is cached by value
+_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+
+def fingerprints(c: cdict_base) -> Generator[Tuple[str, Any], None, None]:
+    hasher = _hasher()
+    width = _BITS // 4
+    for x in c.cdict_iter():
+        if type(x) is _cdict_value:
+            h = hasher.value(x)[0]
+        else:
+            h = _hash(recursive_cdict_item(x))
+        yield f"{h:0{width}x}", recursive_cdict_item(x)
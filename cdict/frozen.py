@@ -0,0 +1,124 @@
+from __future__ import annotations
+import itertools
+import types
+from typing import Any, Generator, Mapping, Optional, Sequence, Tuple, Union, TYPE_CHECKING
+
+from .core import _cdict_value, _grid, _grid_node, _item_kind, _ITEM, _PLAIN, _REPLAY_LIMIT
+
+if TYPE_CHECKING:
+    from .core import cdict_base
+
+# leaf types that get interned, so equal leaves computed separately are one object
+_INTERNED = frozenset([str, bytes, int])
+
+
+class _freezer():
+    # Turns cdict values into read-only mapping views.  A cdict value keeps its view, so sub-dicts
+    # shared between configs (e.g. nested dicts replayed by a product) are one view in all of them,
+    # and plain dicts in the sweep are frozen once while they're memoized.  The memos are cleared
+    # when they fill up, so streaming a sweep takes bounded memory.
+    def __init__(self) -> None:
+        self._leaves: dict[Tuple[type, Any], Any] = {}
+        self._dicts: dict[int, Tuple[Any, Mapping[Any, Any]]] = {}
+
+    def value(self, x: _cdict_value) -> Tuple[Mapping[Any, Any], bool]:
+        # the view of x, and whether it can be shared (not if it holds values like lazy, that can unwrap differently)
+        view: Optional[Mapping[Any, Any]] = getattr(x, "_view", None)
+        if view is not None:
+            return view, True
+        view, stable = self.dict(x.d)
+        if stable:
+            x._view = view
+        return view, stable
+
+    def dict(self, d: Any) -> Tuple[Mapping[Any, Any], bool]:
+        out = {}
+        stable = True
+        for k, v in d.items():
+            out[k], s = self.item(v)
+            stable = stable and s
+        return types.MappingProxyType(out), stable
+
+    def item(self, v: Any) -> Tuple[Any, bool]:
+        t = type(v)
+        if t is _cdict_value:
+            return self.value(v)
+        if t in _INTERNED:
+            leaf = self._leaves.get((t, v))
+            if leaf is None:
+                if len(self._leaves) >= _REPLAY_LIMIT:
+                    self._leaves.clear()
+                leaf = self._leaves[(t, v)] = v
+            return leaf, True
+        kind = _item_kind(t)
+        if kind == _PLAIN:
+            return v, True
+        if kind == _ITEM:
+            return self.item(v.cdict_item())[0], False
+        # a plain dict in the sweep is the same object in every config it's in
+        memo = self._dicts.get(id(v))
+        if memo is not None and memo[0] is v:
+            return memo[1], True
+        view, stable = self.dict(v)
+        if stable:
+            if len(self._dicts) >= _REPLAY_LIMIT:
+                self._dicts.clear()
+            self._dicts[id(v)] = (v, view)
+        return view, stable
+
+
+class _grid_freezer():
+    # Builds the views of a compiled grid's dicts straight from its leaves.  Each nested dict only
+    # depends on some of the axes, so its view is kept per combination of those and shared by
+    # every config with the same values along them.
+    def __init__(self, grid: _grid, freezer: _freezer) -> None:
+        self._axes = grid.axes
+        self._freezer = freezer
+        self._deps: dict[int, Tuple[int, ...]] = {}
+        self._views: dict[int, dict[Tuple[int, ...], Mapping[Any, Any]]] = {}
+        self._find_deps(grid.root)
+
+    def _find_deps(self, node: _grid_node) -> Tuple[int, ...]:
+        deps: list[int] = []
+        for j in node.entries.values():
+            deps.extend([j] if isinstance(j, int) else self._find_deps(j))
+        self._deps[id(node)] = tuple(deps)
+        self._views[id(node)] = {}
+        return self._deps[id(node)]
+
+    def build(self, node: _grid_node, idx: Sequence[int], root: bool = False) -> Tuple[Mapping[Any, Any], bool]:
+        # the view of node at these indices into the axes, and whether it can be shared
+        if not root:
+            key = tuple([idx[j] for j in self._deps[id(node)]])
+            views = self._views[id(node)]
+            view = views.get(key)
+            if view is not None:
+                return view, True
+        out = {}
+        stable = True
+        for k, j in node.entries.items():
+            out[k], s = self._entry(j, idx)
+            stable = stable and s
+        view = types.MappingProxyType(out)
+        if stable and not root:
+            if len(views) >= _REPLAY_LIMIT:
+                views.clear()
+            views[key] = view
+        return view, stable
+
+    def _entry(self, j: Union[int, _grid_node], idx: Sequence[int]) -> Tuple[Any, bool]:
+        if isinstance(j, int):
+            return self._freezer.item(self._axes[j][idx[j]])
+        return self.build(j, idx)
+
+
+def frozen(c: cdict_base) -> Generator[Any, None, None]:
+    freezer = _freezer()
+    grid = c._grid()
+    if grid is not None:
+        builder = _grid_freezer(grid, freezer)
+        for idx in itertools.product(*[range(len(vs)) for vs in grid.axes]):
+            yield builder.build(grid.root, idx, root=True)[0]
+        return
+    for x in c.cdict_iter():
+        yield freezer.item(x)[0]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import time
+from typing import Any, Generator, Iterator, Optional, TYPE_CHECKING
+
+from . import core
+
+if TYPE_CHECKING:
+    from .core import cdict_base
+
+
+class _node_stats():
+    __slots__ = ("node", "calls", "items", "time", "merges", "conflicts")
+
+    def __init__(self, node: cdict_base) -> None:
+        # keep the node alive, so its id isn't reused while profiling
+        self.node = node
+        self.calls = 0
+        self.items = 0
+        self.time = 0.0
+        self.merges = 0
+        self.conflicts = 0
+
+
+class profile():
+    # per node values yielded, time (including nodes below) and merges and conflicts, while active,
+    # for explain, and only for iteration on this thread
+    def __init__(self) -> None:
+        self.stats: dict[int, _node_stats] = {}
+        self._stack: list[_node_stats] = []
+        self._prev: Optional[profile] = None
+
+    def __enter__(self) -> profile:
+        self._prev = core._profiler
+        core._profiler = self
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        core._profiler = self._prev
+
+    def get(self, node: cdict_base) -> Optional[_node_stats]:
+        return self.stats.get(id(node))
+
+    def _wrap(self, node: cdict_base, it: Iterator[Any]) -> Generator[Any, None, None]:
+        stats = self.stats.get(id(node))
+        if stats is None:
+            stats = self.stats[id(node)] = _node_stats(node)
+        stats.calls += 1
+        stack = self._stack
+        while True:
+            stack.append(stats)
+            t = time.perf_counter()
+            try:
+                x = next(it)
+            except StopIteration:
+                return
+            finally:
+                stats.time += time.perf_counter() - t
+                stack.pop()
+            stats.items += 1
+            yield x
+
+    def _merge(self) -> None:
+        if self._stack:
+            self._stack[-1].merges += 1
+
+    def _conflict(self) -> None:
+        if self._stack:
+            self._stack[-1].conflicts += 1
+
+
+# children shown per node, long sums would drown everything else
+_MAX_CHILDREN = 10
+
+
+def _size(c: cdict_base) -> str:
+    n = c._len()
+    if n is not None:
+        return f"n={n}"
+    bound = c._len_bound()
+    return "n=?" if bound is None else f"n<={bound}"
+
+
+def _lines(c: cdict_base, prof: Optional[profile], prefix: str, depth: int, out: list[str]) -> None:
+    line = "  " * depth + prefix + c._label() + "  " + _size(c)
+    stats = prof.get(c) if prof is not None else None
+    if stats is not None:
+        line += (
+            f"  yielded={stats.items} calls={stats.calls} time={stats.time * 1e3:.2f}ms"
+            f" merges={stats.merges} conflicts={stats.conflicts}"
+        )
+    out.append(line)
+    children = c._children()
+    for name, child in children[:_MAX_CHILDREN]:
+        _lines(child, prof, name, depth + 1, out)
+    if len(children) > _MAX_CHILDREN:
+        out.append("  " * (depth + 1) + f"... {len(children) - _MAX_CHILDREN} more")
+
+
+def explain(c: cdict_base, prof: Optional[profile] = None) -> str:
+    out: list[str] = []
+    _lines(c, prof, "", 0, out)
+    return "\n".join(out)
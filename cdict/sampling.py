@@ -0,0 +1,123 @@
+from __future__ import annotations
+import math
+import random
+from typing import Sequence
+
+
+# Sobol direction numbers from Joe and Kuo (new-joe-kuo-6.21201), for the dimensions after the
+# first: degree s and coefficients a of the primitive polynomial, then the initial numbers m
+_SOBOL_PARAMS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+_BITS = 32
+
+
+def _directions(dim: int) -> list[int]:
+    if dim == 0:
+        return [1 << (_BITS - 1 - k) for k in range(_BITS)]
+    s, a, m = _SOBOL_PARAMS[dim - 1]
+    v = [m[k] << (_BITS - 1 - k) for k in range(s)]
+    for k in range(s, _BITS):
+        x = v[k - s] ^ (v[k - s] >> s)
+        for j in range(1, s):
+            if (a >> (s - 1 - j)) & 1:
+                x ^= v[k - j]
+        v.append(x)
+    return v
+
+
+def _scramble(v: list[int], rng: random.Random) -> list[int]:
+    # linear matrix scramble, multiplying by a random lower triangular matrix with unit diagonal
+    rows = [(1 << (_BITS - 1 - r)) | (rng.getrandbits(r) << (_BITS - r) if r else 0) for r in range(_BITS)]
+    scrambled = []
+    for x in v:
+        y = 0
+        for r, row in enumerate(rows):
+            if bin(row & x).count("1") & 1:
+                y |= 1 << (_BITS - 1 - r)
+        scrambled.append(y)
+    return scrambled
+
+
+def sobol(dims: int, n: int, rng: random.Random) -> list[list[float]]:
+    # scrambled Sobol points in [0, 1)^dims, with a random linear matrix scramble and digital shift
+    if dims > len(_SOBOL_PARAMS) + 1:
+        raise ValueError(f"Sobol sampling supports at most {len(_SOBOL_PARAMS) + 1} dimensions, got {dims}")
+    directions = [_scramble(_directions(d), rng) for d in range(dims)]
+    x = [rng.getrandbits(_BITS) for _ in range(dims)]
+    points = []
+    for i in range(n):
+        points.append([xd / (1 << _BITS) for xd in x])
+        # gray code order: flip the direction number at the lowest zero bit of i
+        c = ((i + 1) & -(i + 1)).bit_length() - 1
+        x = [xd ^ directions[d][c] for d, xd in enumerate(x)]
+    return points
+
+
+def latin_hypercube(dims: int, n: int, rng: random.Random) -> list[list[float]]:
+    # each dimension's n values fall in different strata of [0, 1)
+    columns = []
+    for _ in range(dims):
+        strata = list(range(n))
+        rng.shuffle(strata)
+        columns.append([(t + rng.random()) / n for t in strata])
+    return [list(p) for p in zip(*columns)]
+
+
+def stratified(sizes: Sequence[int], n: int, rng: random.Random) -> list[list[int]]:
+    # Split the grid into about n cells by cutting dimensions into strata in turn, and sample cells
+    # evenly (every cell before any twice), uniformly within each cell.
+    strata = [1] * len(sizes)
+    grew = True
+    while grew:
+        grew = False
+        for d, size in enumerate(sizes):
+            if strata[d] < size and math.prod(strata) // strata[d] * (strata[d] + 1) <= n:
+                strata[d] += 1
+                grew = True
+    ncells = math.prod(strata)
+    cells: list[int] = []
+    while len(cells) < n:
+        rnd = list(range(ncells))
+        rng.shuffle(rnd)
+        cells.extend(rnd[:n - len(cells)])
+    points = []
+    for cell in cells:
+        digits = []
+        for size, s in zip(reversed(sizes), reversed(strata)):
+            cell, t = divmod(cell, s)
+            digits.append(rng.randrange(t * size // s, (t + 1) * size // s))
+        points.append(digits[::-1])
+    return points
+
+
+def digits(method: str, sizes: Sequence[int], n: int, rng: random.Random) -> list[list[int]]:
+    # n points on the grid with the given dimension sizes, as digits along each dimension
+    if method == "stratified":
+        return stratified(sizes, n, rng)
+    if method == "lhs":
+        points = latin_hypercube(len(sizes), n, rng)
+    elif method == "sobol":
+        points = sobol(len(sizes), n, rng)
+    else:
+        raise ValueError(f"Unknown sampling method {method!r}, expected 'uniform', 'lhs', 'sobol' or 'stratified'")
+    return [[int(u * size) for u, size in zip(p, sizes)] for p in points]
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import array
+import importlib
+import json
+import os
+import struct
+import sys
+import threading
+from typing import Any, Callable, Generator, Optional
+
+from .core import cdict_base, _cdict_value
+
+# The index file next to a dump holds a header naming the format, then the byte offset of every
+# record followed by the end of the last one, as little-endian uint64s, so record i is the bytes
+# between entries i and i + 1.
+_INDEX_MAGIC = b"CDICTIX"
+_FORMATS = {"jsonl": b"j", "msgpack": b"m"}
+# how many bytes of records to buffer between writes
+_WRITE_BUFFER = 1 << 20
+# positioned reads that don't move the file offset, Unix only
+_HAS_PREAD = hasattr(os, "pread")
+
+
+def _msgpack() -> Any:
+    try:
+        return importlib.import_module("msgpack")
+    except ImportError:
+        raise ImportError("the msgpack format requires msgpack, install it with `pip install msgpack`") from None
+
+
+def _index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def _encoder(format: str) -> Callable[[Any], bytes]:
+    if format == "jsonl":
+        return lambda x: json.dumps(x).encode() + b"\n"
+    if format == "msgpack":
+        packer = _msgpack().Packer()
+        return packer.pack  # type: ignore[no-any-return]
+    raise ValueError(f"Unknown format {format!r}, expected one of {list(_FORMATS)}")
+
+
+def _decoder(format: str) -> Callable[[bytes], Any]:
+    if format == "jsonl":
+        return json.loads
+    msgpack = _msgpack()
+    return lambda b: msgpack.unpackb(b, strict_map_key=False)
+
+
+def dump(c: cdict_base, path: str, format: str = "jsonl") -> int:
+    encode = _encoder(format)
+    offsets = array.array("Q")
+    n = 0
+    with open(path, "wb") as f, open(_index_path(path), "wb") as idx:
+        idx.write(_INDEX_MAGIC + _FORMATS[format])
+        chunks: list[bytes] = []
+        buffered = 0
+        pos = 0
+
+        def flush() -> None:
+            nonlocal buffered
+            f.write(b"".join(chunks))
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            idx.write(offsets.tobytes())
+            del chunks[:], offsets[:]
+            buffered = 0
+
+        for x in c:
+            b = encode(x)
+            offsets.append(pos)
+            chunks.append(b)
+            pos += len(b)
+            buffered += len(b)
+            n += 1
+            if buffered >= _WRITE_BUFFER:
+                flush()
+        offsets.append(pos)
+        flush()
+    return n
+
+
+class _cdict_file(cdict_base):
+    # a dump read back by seeking to its records, so it's indexable without reading the whole file
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._fds: Optional[tuple[int, int]] = None
+        self._lock = threading.Lock()
+        with open(_index_path(path), "rb") as idx:
+            header = idx.read(len(_INDEX_MAGIC) + 1)
+            size = os.fstat(idx.fileno()).st_size
+        formats = {v: k for k, v in _FORMATS.items()}
+        if header[:-1] != _INDEX_MAGIC or header[-1:] not in formats:
+            raise ValueError(f"{_index_path(path)} is not a cdict index")
+        self._format = formats[header[-1:]]
+        self._n = (size - len(header)) // 8 - 1
+        self._decode = _decoder(self._format)
+
+    def _open(self) -> tuple[int, int]:
+        if self._fds is None:
+            flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+            self._fds = (os.open(self._path, flags), os.open(_index_path(self._path), flags))
+        return self._fds
+
+    def _pread(self, fd: int, n: int, offset: int) -> bytes:
+        # pread on raw file descriptors is safe to share between threads, where there's no pread
+        # (e.g. Windows) seeking and reading has to hold a lock
+        if _HAS_PREAD:
+            return os.pread(fd, n, offset)
+        with self._lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, n)
+
+    def close(self) -> None:
+        if self._fds is not None:
+            for fd in self._fds:
+                os.close(fd)
+            self._fds = None
+
+    def __del__(self) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # file descriptors and decoders don't survive pickling, so workers reopen the files
+        return dict(_path=self._path)
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["_path"])  # type: ignore[misc]
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        if self._format == "jsonl":
+            with open(self._path, "rb") as f:
+                for line in f:
+                    yield _cdict_value(json.loads(line))
+        else:
+            with open(self._path, "rb") as f:
+                for x in _msgpack().Unpacker(f, strict_map_key=False):
+                    yield _cdict_value(x)
+
+    def _len(self) -> Optional[int]:
+        return self._n
+
+    def _reiterable(self) -> bool:
+        return True
+
+    def _get(self, i: int) -> Any:
+        data, idx = self._open()
+        start, end = struct.unpack("<2Q", self._pread(idx, 16, len(_INDEX_MAGIC) + 1 + 8 * i))
+        return _cdict_value(self._decode(self._pread(data, end - start, start)))
+
+    def __repr__(self) -> str:
+        return f"load({self._path!r})"
+
+
+def load(path: str) -> cdict_base:
+    return _cdict_file(path)
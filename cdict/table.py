@@ -0,0 +1,142 @@
+from __future__ import annotations
+import array
+from typing import Any, Generator, Iterator, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from .core import cdict_base, _axes_layout, _canonical, _cdict_value
+from .columns import _flatten
+
+if TYPE_CHECKING:
+    from .core import Axis
+
+# pool entries for a key missing from a row, and for a key holding an empty dict (nested dicts
+# are split into columns for their leaves, so an empty one leaves nothing else to rebuild it from)
+_MISSING = object()
+_EMPTY = object()
+
+
+def _typecode(n: int) -> str:
+    # the smallest unsigned array type with room for codes 0 .. n - 1
+    for tc in "BHI":
+        if n <= 1 << (8 * array.array(tc).itemsize):
+            return tc
+    return "Q"
+
+
+class _column():
+    # the distinct values of one key path, and the code of each row's value among them
+    __slots__ = ("path", "pool", "index", "codes")
+
+    def __init__(self, path: Tuple[Any, ...]) -> None:
+        self.path = path
+        self.pool: list[Any] = []
+        self.index: dict[Any, int] = {}
+        self.codes = array.array("B")
+
+    def code(self, v: Any) -> int:
+        key = _MISSING if v is _MISSING else _EMPTY if v is _EMPTY else _canonical(v)
+        c = self.index.get(key)
+        if c is None:
+            c = self.index[key] = len(self.pool)
+            self.pool.append(v)
+            tc = _typecode(len(self.pool))
+            if tc != self.codes.typecode:
+                self.codes = array.array(tc, self.codes)
+        return c
+
+
+class _cdict_table(cdict_base):
+    # A materialized sweep, stored as columns of small integer codes into per-key pools of values,
+    # with each row's dicts rebuilt when it's read.
+    def __init__(self, columns: Sequence[_column], n: int) -> None:
+        self._columns = columns
+        self._n = n
+
+    def _row(self, i: int) -> _cdict_value:
+        d: dict[Any, Any] = {}
+        # the dicts built so far, by path, nested ones wrapped in cdict values so they aren't copied again
+        nested: dict[Tuple[Any, ...], dict[Any, Any]] = {(): d}
+
+        def at(path: Tuple[Any, ...]) -> dict[Any, Any]:
+            sub = nested.get(path)
+            if sub is None:
+                sub = nested[path] = {}
+                at(path[:-1])[path[-1]] = _cdict_value(sub)
+            return sub
+
+        for col in self._columns:
+            v = col.pool[col.codes[i]]
+            if v is _MISSING:
+                continue
+            if v is _EMPTY:
+                at(col.path)
+            else:
+                at(col.path[:-1])[col.path[-1]] = v
+        return _cdict_value(d)
+
+    def cdict_iter(self) -> Generator[_cdict_value, None, None]:
+        row = self._row
+        for i in range(self._n):
+            yield row(i)
+
+    def _len(self) -> Optional[int]:
+        return self._n
+
+    def _reiterable(self) -> bool:
+        return True
+
+    def _keys(self) -> Optional[frozenset[Any]]:
+        return frozenset(col.path[0] for col in self._columns)
+
+    def _get(self, i: int) -> Any:
+        return self._row(i)
+
+    def _iter_from(self, i: int) -> Iterator[Any]:
+        return map(self._row, range(i, self._n))
+
+    def __repr__(self) -> str:
+        return f"table({self._n} rows, {len(self._columns)} columns)"
+
+
+def _from_axes(axes: list[Axis]) -> _cdict_table:
+    n, layout = _axes_layout(axes)
+    columns = []
+    for (path, values), (repeats, tiles) in zip(axes, layout):
+        col = _column(path)
+        codes = [col.code(v) for v in values]
+        block = array.array(col.codes.typecode)
+        for c in codes:
+            block.extend(array.array(col.codes.typecode, [c]) * repeats)
+        col.codes = block * tiles
+        columns.append(col)
+    return _cdict_table(columns, n)
+
+
+def materialize(c: cdict_base) -> _cdict_table:
+    axes = c._axes()
+    if axes is not None:
+        return _from_axes(axes)
+
+    columns: dict[Tuple[Any, ...], _column] = {}
+    n = 0
+    row: dict[Tuple[Any, ...], Any] = {}
+    for d in c:
+        if not isinstance(d, dict):
+            raise TypeError(f"Can only materialize sweeps of dicts, got {d!r}")
+        row.clear()
+        _flatten(d, (), row)
+        for path, v in row.items():
+            col = columns.get(path)
+            if col is None:
+                col = columns[path] = _column(path)
+                if n:
+                    missing = col.code(_MISSING)
+                    col.codes.extend(array.array(col.codes.typecode, [missing]) * n)
+            code = col.code(_EMPTY if isinstance(v, dict) else v)
+            col.codes.append(code)
+        n += 1
+        if len(row) < len(columns):
+            for path, col in columns.items():
+                if path not in row:
+                    code = col.code(_MISSING)
+                    col.codes.append(code)
+    return _cdict_table(list(columns.values()), n)
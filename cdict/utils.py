@@ -1,4 +1,6 @@
-from typing import Any, Callable
+from typing import Any, Callable, Optional, Union
+import collections
+import threading
 
 
 class overridable():
@@ -43,9 +45,62 @@ def combiner(f: Callable[[Any, Any], Any], multi: bool = True) -> Callable[[Any]
     return lambda x: combinable(x, f, multi)
 
 
+class lazy_cache():
+    # thread-safe store of cached lazy values, evicting the least recent ("lru") or oldest ("fifo") past maxsize
+    def __init__(self, maxsize: Optional[int] = None, policy: str = "lru"):
+        if policy not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy {policy!r}, expected 'lru' or 'fifo'")
+        if maxsize is not None and maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got {maxsize}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._values: collections.OrderedDict[Any, Any] = collections.OrderedDict()
+        # one lock per value being computed, so each value is computed once even with concurrent consumers
+        self._computing: dict[Any, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Any) -> tuple[bool, Any]:
+        # call with self._lock held
+        if key not in self._values:
+            return False, None
+        if self.policy == "lru":
+            self._values.move_to_end(key)
+        return True, self._values[key]
+
+    def get(self, key: Any, f: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            computing = self._computing.setdefault(key, threading.Lock())
+        with computing:
+            with self._lock:
+                found, value = self._lookup(key)
+                if found:
+                    return value
+            value = f()
+            with self._lock:
+                self._values[key] = value
+                while self.maxsize is not None and len(self._values) > self.maxsize:
+                    self._values.popitem(last=False)
+                self._computing.pop(key, None)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
 class lazy():
-    def __init__(self, f: Callable[[], Any]):
+    def __init__(self, f: Callable[[], Any], cache: Union[bool, lazy_cache] = False):
+        # with cache, f runs once and its value is shared by every config it ends up in
         self.f = f
+        self.cache: Optional[lazy_cache] = lazy_cache() if cache is True else cache if isinstance(cache, lazy_cache) else None
 
     def cdict_item(self) -> Any:
-        return self.f()
+        if self.cache is None:
+            return self.f()
+        return self.cache.get(self, self.f)
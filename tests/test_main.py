@@ -6,6 +6,12 @@ import traceback
 import sys
 
 import cdict as C
+import cdict.core
+import cdict.store
+import itertools
+import asyncio
+import json
+import concurrent.futures
 import mypy.api
 
 
@@ -528,6 +534,813 @@ def test_lazy():
     assert called
 
 
+def test_lazy_cache():
+    calls = []
+    def f():
+        calls.append(1)
+        return [len(calls)]
+
+    sweep = C.dict(data=C.lazy(f, cache=True)) * C.dict(a=C.iter(range(10)))
+    configs = list(sweep)
+    assert len(calls) == 1
+    assert all(c["data"] is configs[0]["data"] for c in configs)
+    list(sweep)
+    assert len(calls) == 1
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        list(C.dict(data=C.lazy(f, cache=True), a=C.iter(range(50))).map(lambda x: x, executor=pool))
+    assert len(calls) == 2
+
+    # a bounded cache shared between lazys recomputes evicted values
+    cache = C.lazy_cache(maxsize=2)
+    keys = {k: C.lazy(lambda k=k: calls.append(k) or k, cache=cache) for k in "abc"}
+    assert [keys[k].cdict_item() for k in "abab"] == list("abab")
+    assert calls[2:] == ["a", "b"]
+    keys["c"].cdict_item()
+    keys["b"].cdict_item()
+    keys["a"].cdict_item()
+    assert calls[2:] == ["a", "b", "c", "a"]
+    assert len(cache) == 2
+
+    fifo = C.lazy_cache(maxsize=2, policy="fifo")
+    del calls[:]
+    keys = {k: C.lazy(lambda k=k: calls.append(k) or k, cache=fifo) for k in "abc"}
+    for k in "abaca":
+        keys[k].cdict_item()
+    assert calls == ["a", "b", "c", "a"]
+    with pytest.raises(ValueError):
+        C.lazy_cache(policy="random")
+
+
+def test_len():
+    sweep = C.dict(a=C.list(1, 2, 3), b=C.iter(range(4)), c=5) * (C.dict(d=1) + C.dict(d=C.list(2, 3)))
+    assert sweep.size(strict=True) == 36
+    assert len(sweep) == len(list(sweep))
+
+    nested = C.dict(x=C.dict(a=C.list(1, 2)) + C.dict(a=3), y=C.sum(C.dict(b=b) for b in range(4)))
+    assert nested.size(strict=True) == 12 == len(list(nested))
+
+    assert (C.dict(a=C.list(1, 2)) | C.dict(b=C.list(3, 4))).size(strict=True) == 2
+    # mismatched zips only fail when iterated, and structural queries work before that
+    mismatched = C.dict(a=C.list(1, 2, 3)) | C.dict(b=C.list(1, 2))
+    assert mismatched._len() is None
+    with pytest.raises(ValueError):
+        len(mismatched)
+    with pytest.raises(ValueError):
+        list(C.list(C.dict(c=1)) * mismatched)
+    next(mismatched.iter_from())
+    mismatched.explain()
+
+    assert len(C.list()) == 0
+    assert len(C.dict()) == 1
+
+    # sizes that depend on user code or one-shot iterators are counted by iterating
+    calls = 0
+    def big_a(x):
+        nonlocal calls
+        calls += 1
+        return x['a'] > 1
+
+    filtered = sweep.filter(big_a)
+    assert len(filtered) == 24 == filtered.size()
+    with pytest.raises(TypeError):
+        filtered.size(strict=True)
+    # counting has no side effects on later iterations
+    calls = 0
+    assert len(filtered) == 24 and calls == 36
+    assert [x for x in filtered] == [x for x in filtered] == [x for x in sweep if x['a'] > 1]
+    assert calls == 36 * 3
+
+    gen = C.dict(a=C.iter(x for x in range(3)))
+    with pytest.raises(TypeError):
+        gen.size(strict=True)
+    # counting would use up the iterator
+    with pytest.raises(TypeError):
+        gen.size()
+    with pytest.raises(TypeError):
+        len(gen)
+    assert list(gen) == [dict(a=0), dict(a=1), dict(a=2)]
+
+
+def test_getitem():
+    joinstr = C.combiner(lambda a, b: a + "." + b)
+    sweeps = [
+        C.dict(a=C.list(1, 2, 3), b=C.iter(range(4)), c=5) * (C.dict(d=1) + C.dict(d=C.list(2, 3))),
+        C.dict(x=C.dict(a=C.list(1, 2)) + C.dict(a=3) + C.list(), y=C.sum(C.dict(b=b) for b in range(4))),
+        C.dict(a=C.list(1, 2)) * C.dict(b=C.list(3, 4)) | C.dict(c=C.list(5, 6, 7, 8)),
+        C.sum(joinstr(f"a{i}") for i in range(3)) * C.sum(joinstr(f"b{i}") for i in range(2)),
+        C.dict(a=C.defaultdict(a=1, b=1)) * C.dict(a=C.dict(a=C.list(2, 3))),
+        C.list() + C.dict(a=C.list(1, 2)) + C.list() + C.dict(b=3),
+    ]
+    for sweep in sweeps:
+        expected = list(sweep)
+        assert len(expected) > 0
+        for i in range(-len(expected), len(expected)):
+            assert sweep[i] == expected[i]
+        for s in [slice(None), slice(1, None), slice(None, -1), slice(None, None, 2), slice(None, None, -1), slice(-3, 10, 3)]:
+            assert list(sweep[s]) == expected[s]
+            assert len(sweep[s]) == len(expected[s])
+        assert sweep[1:][::2][-1] == expected[1:][::2][-1]
+        with pytest.raises(IndexError):
+            sweep[len(expected)]
+        with pytest.raises(IndexError):
+            sweep[-len(expected) - 1]
+
+    # nodes that can't be indexed are iterated instead
+    filtered = C.dict(a=C.list(1, 2, 3, 4)).filter(lambda x: x['a'] % 2 == 0)
+    assert filtered[1] == dict(a=4)
+    assert filtered[-1] == dict(a=4)
+    assert list(filtered[1:]) == [dict(a=4)]
+    assert list(filtered[::-1]) == [dict(a=4), dict(a=2)]
+    with pytest.raises(IndexError):
+        filtered[2]
+
+
+def test_shard():
+    combines = 0
+    class counting(int):
+        def cdict_combine(self, other):
+            nonlocal combines
+            combines += 1
+            return counting(self * 10 + other)
+
+    sweep = C.sum(counting(i) for i in range(10)) * C.sum(counting(j) for j in range(10))
+    expected = list(sweep)
+    for layout in ["contiguous", "strided"]:
+        shards = []
+        for k in range(7):
+            combines = 0
+            shard = list(sweep.shard(k, 7, layout=layout))
+            # only this shard's configs get built
+            assert combines == len(shard)
+            assert len(shard) in (14, 15)
+            shards.append(shard)
+        if layout == "contiguous":
+            assert sum(shards, []) == expected
+        else:
+            assert sorted(sum(shards, [])) == expected
+            assert shards[3] == expected[3::7]
+
+    # unindexable cdicts are partitioned by skipping
+    filtered = C.dict(a=C.iter(range(20))).filter(lambda x: x['a'] % 3 != 0)
+    expected = list(filtered)
+    for layout in ["contiguous", "strided"]:
+        shards = [list(filtered.shard(k, 4, layout=layout)) for k in range(4)]
+        assert sorted(sum(shards, []), key=lambda x: x['a']) == expected
+        assert [len(s) for s in shards] == ([3, 3, 3, 4] if layout == "contiguous" else [4, 3, 3, 3])
+
+    # one-shot iterators can only be counted by reading them, so each shard buffers its stream
+    def gen():
+        return C.iter(C.dict(a=i) for i in range(7))
+    for layout in ["contiguous", "strided"]:
+        shards = [list(gen().shard(k, 3, layout=layout)) for k in range(3)]
+        assert sorted(sum(shards, []), key=lambda x: x['a']) == [dict(a=i) for i in range(7)]
+        assert [len(shard) for shard in shards] in ([2, 2, 3], [3, 2, 2])
+
+    with pytest.raises(ValueError):
+        sweep.shard(7, 7)
+    with pytest.raises(ValueError):
+        sweep.shard(0, 7, layout="random")
+
+
+def test_long_sums():
+    n = 5000
+    sweep = C.sum(C.dict(a=i) for i in range(n))
+    assert list(sweep) == [dict(a=i) for i in range(n)]
+    assert sweep[n // 2] == dict(a=n // 2)
+
+    chained = C.list()
+    for i in range(n):
+        chained = chained + C.dict(a=i)
+    assert_equivalent(chained, sweep)
+
+    # + doesn't copy the parts so far, and the chain it builds is flattened without recursing
+    chained = C.list()
+    for i in range(50000):
+        chained = chained + C.dict(a=i)
+    assert len(chained._items) == 2
+    assert len(chained) == 50000 and chained[-2] == dict(a=49998)
+    assert list(chained[10:13]) == [dict(a=i) for i in range(10, 13)]
+
+    # sums of sums stay flat
+    assert_equivalent(C.sum([sweep, sweep[:2]]) + (sweep[2:] + sweep), sweep + sweep + sweep)
+
+
+def test_streaming_product(monkeypatch):
+    pulled = []
+    def gen(name, n):
+        for i in range(n):
+            pulled.append(name)
+            yield i
+
+    sweep = C.dict(a=C.iter(gen('a', 1000)), b=C.iter(gen('b', 1000))) * C.dict(c=C.iter(gen('c', 1000)))
+    assert next(iter(sweep)) == dict(a=0, b=0, c=0)
+    assert pulled == ['a', 'b', 'c']
+
+    sweep = C.dict(a=C.list(*range(1000))) * C.dict(b=C.list(*range(1000)))
+    assert list(sweep.head(2)) == [dict(a=0, b=0), dict(a=0, b=1)]
+    assert list(itertools.islice(sweep, 1)) == [dict(a=0, b=0)]
+
+    for limit in [1, 100]:
+        monkeypatch.setattr(cdict.core, "_REPLAY_LIMIT", limit)
+        # one-shot operands are still fully cached
+        sweep = C.dict(a=C.iter(gen('a', 3)), b=C.iter(gen('b', 3))) * C.dict(c=C.iter(gen('c', 3)))
+        assert list(sweep) == [dict(a=a, b=b, c=c) for a in range(3) for b in range(3) for c in range(3)]
+        assert list(sweep) == []
+
+        # re-iterable operands are re-iterated once they pass the limit
+        sweep = C.dict(a=C.list(1, 2, 3)) * C.dict(b=C.iter(range(3)), c=C.list(4, 5)) * C.dict(d=1)
+        assert list(sweep) == [dict(a=a, b=b, c=c, d=1) for a in [1, 2, 3] for b in range(3) for c in [4, 5]]
+        assert list(sweep) == list(sweep)
+
+
+def test_product_merges(monkeypatch):
+    merges = 0
+    combine_dicts = cdict.core._combine_dicts
+    def counting_combine_dicts(*args):
+        nonlocal merges
+        merges += 1
+        return combine_dicts(*args)
+    monkeypatch.setattr(cdict.core, "_combine_dicts", counting_combine_dicts)
+
+    sweep = C.dict(a=C.list(1, 2)) * C.dict(b=C.list(3, 4)) * C.defaultdict(c=5) * C.dict(c=C.list(6, 7)) * C.dict(d=8)
+    expected = [dict(a=a, b=b, c=c, d=8) for a in [1, 2] for b in [3, 4] for c in [6, 7]]
+    assert list(sweep) == expected
+    assert merges == len(expected)
+    merges = 0
+    assert [sweep[i] for i in range(len(expected))] == expected
+    assert merges == len(expected)
+
+    # finality and conflicts are still checked left to right
+    with pytest.raises(ValueError):
+        list(C.dict(a=1) * C.finaldict(b=2) * C.dict(c=3))
+    assert list(C.dict(a=1) * C.dict(b=2) * C.finaldict(c=3)) == [dict(a=1, b=2, c=3)]
+    with pytest.raises(ValueError):
+        list(C.dict(a=C.overridable(1)) * C.dict(a=2) * C.dict(a=3))
+
+
+def test_disjoint_merges(monkeypatch):
+    conflicts = 0
+    combine_key = cdict.core._combine_key
+    def counting_combine_key(*args):
+        nonlocal conflicts
+        conflicts += 1
+        return combine_key(*args)
+    monkeypatch.setattr(cdict.core, "_combine_key", counting_combine_key)
+
+    sweep = C.dict(a=C.list(1, 2)) * (C.dict(b=1) + C.dict(c=C.list(1, 2))) * C.dict(d=C.dict(e=1))
+    assert list(sweep) == [
+        dict(a=1, b=1, d=dict(e=1)), dict(a=1, c=1, d=dict(e=1)), dict(a=1, c=2, d=dict(e=1)),
+        dict(a=2, b=1, d=dict(e=1)), dict(a=2, c=1, d=dict(e=1)), dict(a=2, c=2, d=dict(e=1)),
+    ]
+    assert conflicts == 0
+
+    # only keys that may overlap go through conflict resolution
+    sweep = C.defaultdict(a=0, b=0) * C.dict(a=C.list(1, 2), c=3) * (C.dict(d=4) + C.dict(b=5))
+    assert list(sweep) == [
+        dict(a=1, b=0, c=3, d=4), dict(a=1, b=5, c=3),
+        dict(a=2, b=0, c=3, d=4), dict(a=2, b=5, c=3),
+    ]
+    assert conflicts == 6
+    with pytest.raises(ValueError):
+        list(sweep * C.dict(c=4))
+
+
+def test_quiet_iteration(capsys):
+    sweep = C.sum(C.dict(a=a) for a in range(3)) * C.dict(b=C.list(1, 2), c=C.dict(d=C.iter(range(2))))
+    assert len(list(sweep)) == 12
+    assert capsys.readouterr().out == ""
+
+
+def test_to_columns():
+    np = pytest.importorskip("numpy")
+
+    grids = [
+        C.dict(a=C.list(1, 2, 3), b=C.iter(range(4)), c="x") * C.dict(d=C.list(0.5, 1.5)),
+        C.dict(model=C.dict(width=C.list(8, 16), act=C.list("relu", "gelu")), lr=C.list(1e-3, 1e-4)) * C.finaldict(seed=C.list(0, 1, 2)),
+        C.dict(a=C.list(1, "a", (1, 2)), b=C.dict(c=C.dict(d=C.list(True, False)))),
+    ]
+    for sweep in grids:
+        assert sweep._axes() is not None
+        columns = sweep.to_columns()
+        rows = list(sweep)
+        expected = {}
+        for row in rows:
+            stack = [((), row)]
+            while stack:
+                prefix, d = stack.pop()
+                for k, v in d.items():
+                    if isinstance(v, dict):
+                        stack.append((prefix + (k,), v))
+                    else:
+                        expected.setdefault(".".join(prefix + (k,)), []).append(v)
+        assert sorted(columns) == sorted(expected)
+        for k, col in columns.items():
+            assert len(col) == len(rows)
+            assert list(col) == expected[k]
+    assert grids[0].to_columns()["b"].dtype.kind == "i"
+    assert grids[2].to_columns()["a"].dtype == object
+
+    # axes come from the compiled grid, so nested dicts merged across factors and axes too big
+    # to iterate as a grid are still exported straight from them
+    sweep = C.dict(m=C.dict(w=C.list(1, 2))) * C.dict(m=C.dict(a=C.list("x", "y")), b=C.iter(range(1 << 17)))
+    assert [path for path, _ in sweep._axes()] == [("m", "w"), ("m", "a"), ("b",)]
+    columns = sweep.to_columns()
+    assert columns["m.a"][:3].tolist() == ["x"] * 3 and columns["b"][-2:].tolist() == [(1 << 17) - 2, (1 << 17) - 1]
+    assert C.dict(a=C.list(1, 2), b=C.dict())._axes() is None
+
+    # an empty axis makes every column empty
+    columns = C.dict(a=C.list(), b=C.list(1, 2)).to_columns()
+    assert sorted(columns) == ["a", "b"] and all(len(col) == 0 for col in columns.values())
+
+    # sweeps that aren't plain grids are built row by row, with missing values masked
+    sweep = C.dict(a=C.list(1, 2), b=C.dict(c=3)) + C.dict(a=3, d="x") + C.dict(b=C.overridable(dict(c=4)))
+    assert sweep._axes() is None
+    columns = sweep.to_columns()
+    assert list(columns) == ["a", "b.c", "d"]
+    assert columns["a"].tolist() == [1, 2, 3, None]
+    assert columns["b.c"].tolist() == [3, 3, None, 4]
+    assert columns["d"].tolist() == [None, None, "x", None]
+    assert columns["b.c"].dtype.kind == "i"
+
+    # conflicts still need resolving, so aren't grids
+    for sweep in [C.defaultdict(a=1) * C.dict(a=C.list(2, 3)), C.finaldict(a=1) * C.dict(b=2)]:
+        assert sweep._axes() is None
+    assert (C.defaultdict(a=1) * C.dict(a=C.list(2, 3))).to_columns()["a"].tolist() == [2, 3]
+
+
+def test_filter_pushdown():
+    calls = 0
+    def small(x):
+        nonlocal calls
+        calls += 1
+        return x['a'] * x['b'] < 20
+
+    grid = C.dict(a=C.iter(range(10)), b=C.list(*range(10)), c=C.list(*range(100)))
+    expected = list(grid.filter(small))
+    calls = 0
+    assert list(iter(grid.filter(small, keys=['a', 'b']))) == expected
+    assert calls == 100
+
+    sweeps = [
+        grid,
+        C.dict(a=C.iter(range(10))) * C.dict(c=C.list(*range(10))) * C.dict(b=C.list(*range(10))) * C.dict(d=1),
+        C.dict(a=C.list(1, 2, 30)) * (C.dict(b=C.list(1, 2)) + C.dict(b=C.list(5, 6), d=1)) * C.dict(c=C.list(7, 8)),
+        C.defaultdict(a=0, b=0) * C.dict(a=C.list(1, 2, 30)) * C.dict(b=C.list(1, 5), c=C.list(0, 1)),
+        C.dict(a=C.list(1, 2, 30), b=C.list(1, 5)).map(lambda x: x) * C.dict(c=C.list(0, 1)),
+        (C.dict(a=C.list(1, 2, 30), b=C.list(1, 5)) | C.dict(c=C.list(3, 4, 5, 6, 7, 8))),
+    ]
+    for sweep in sweeps:
+        assert list(sweep.filter(small, keys=['a', 'b'])) == list(sweep.filter(small))
+        assert list(sweep.filter(lambda x: x['a'] > 1, keys=['a'])) == list(sweep.filter(lambda x: x['a'] > 1))
+        raw_fn = lambda x: x['a'] != 2
+        assert list(sweep.filter(raw_fn, raw=True, keys=['a'])) == list(sweep.filter(raw_fn, raw=True))
+
+    # defaults still get overridden, and the result combines like an unpushed filter
+    sweep = C.defaultdict(a=0, b=0, c=0) * C.dict(a=C.list(1, 2, 30)) * C.dict(c=C.list(1, 2))
+    filtered = sweep.filter(lambda x: x['a'] < 10, keys=['a'])
+    assert list(filtered) == [dict(a=a, b=0, c=c) for a in [1, 2] for c in [1, 2]]
+    with pytest.raises(ValueError):
+        list(filtered * C.dict(b=1))
+    assert list(sweep.filter(lambda x: x['a'] < 10, keys=['a'], raw=True) * C.dict(b=1))[0] == dict(a=1, b=1, c=1)
+
+    # functions reading keys that some configs don't have fail like before
+    with pytest.raises(KeyError):
+        list((C.dict(a=1) + C.dict(b=2)).filter(lambda x: x['a'] > 0, keys=['a']))
+
+    # functions reading no keys filter the first factor
+    assert list((C.dict(a=1) * C.dict(b=2)).filter(lambda x: True, keys=[])) == [dict(a=1, b=2)]
+    assert list((C.dict(a=1) * C.dict(b=2)).filter(lambda x: False, keys=[])) == []
+    assert list((C.dict() * C.sum([])).filter(lambda x: True, keys=[])) == []
+
+
+def test_distinct():
+    sweep = (
+        C.dict(a=C.list(1, 2), b=C.dict(c=C.list(3, 4))) +
+        C.dict(b=C.dict(c=C.overridable(4)), a=C.combinable(1, lambda x, y: x + y)) +
+        C.dict(a=3, b=dict(c=3)) * C.dict(d=C.list([1], [2], [1]))
+    ) * C.dict(e=C.list(5, 5))
+    rows = list(sweep)
+    expected = []
+    for row in rows:
+        if row not in expected:
+            expected.append(row)
+    assert len(expected) < len(rows)
+    assert list(sweep.distinct()) == expected
+    assert list(sweep.distinct(approx=True)) == expected
+    # distinct values survive combining, duplicates of mapped configs are dropped
+    assert list(sweep.distinct() * C.dict(f=1)) == [dict(x, f=1) for x in expected]
+    assert list(sweep.map(lambda x: dict(a=x['a'])).distinct()) == [dict(a=1), dict(a=2), dict(a=3)]
+
+    # values that compare equal but differ in type or sign are distinct configs
+    mixed = C.dict(a=C.list(1, 1.0, True, 0.0, -0.0, 1), b=C.list((1,), (1.0,)))
+    assert [(type(x['a']), repr(x['a']), x['b']) for x in mixed.distinct()] == [
+        (type(x['a']), repr(x['a']), x['b']) for x in mixed][:10]
+
+    big = C.dict(a=C.iter(range(2000)), b=C.list(1, 1))
+    assert list(big.distinct(approx=True)) == [dict(a=a, b=1) for a in range(2000)]
+    # a tiny memory budget over-approximates what's been seen
+    assert len(list(big.distinct(approx=True, max_bytes=16))) < 2000
+
+
+def test_sample():
+    huge = C.dict(**{f"k{i}": C.iter(range(10)) for i in range(9)}) * C.dict(seed=C.list(0, 1))
+    sample = huge.sample(5, seed=0)
+    configs = list(sample)
+    assert len(configs) == len(sample) == 5
+    assert configs == list(huge.sample(5, seed=0))
+    assert configs != list(huge.sample(5, seed=1))
+    assert len(set(str(c) for c in configs)) == 5
+    assert sample[-1] == configs[-1]
+    # in sweep order
+    assert configs == sorted(configs, key=lambda c: [c[f"k{i}"] for i in range(9)] + [c["seed"]])
+
+    sweep = C.dict(a=C.list(1, 2, 3), b=C.list(4, 5, 6))
+    assert list(sweep.sample(9, seed=2)) == list(sweep)
+    unseeded = sweep.sample(3)
+    assert list(unseeded) == list(unseeded)
+    with pytest.raises(ValueError):
+        list(sweep.sample(10))
+
+    # unindexable cdicts are reservoir sampled
+    filtered = C.dict(a=C.iter(range(100))).filter(lambda x: x['a'] % 2 == 0)
+    configs = list(filtered.sample(10, seed=0))
+    assert len(configs) == 10
+    assert configs == list(filtered.sample(10, seed=0))
+    assert all(c['a'] % 2 == 0 for c in configs)
+    assert configs == sorted(configs, key=lambda c: c['a'])
+    assert list(filtered.sample(50, seed=0)) == list(filtered)
+    with pytest.raises(ValueError):
+        list(filtered.sample(51, seed=0))
+
+
+def test_space_filling_sample():
+    sweep = C.dict(lr=C.iter(range(10)), wd=C.iter(range(10)), model=C.dict(depth=C.iter(range(10))))
+    for method in ["lhs", "sobol", "stratified"]:
+        configs = list(sweep.sample(10, seed=0, method=method))
+        assert configs == list(sweep.sample(10, seed=0, method=method))
+        assert len(set(str(c) for c in configs)) == 10
+    # a latin hypercube hits every value of every axis exactly once
+    configs = list(sweep.sample(10, seed=3, method="lhs"))
+    assert sorted(c["lr"] for c in configs) == list(range(10))
+    assert sorted(c["wd"] for c in configs) == list(range(10))
+    assert sorted(c["model"]["depth"] for c in configs) == list(range(10))
+    # stratified splits small sweeps into cells, one point per cell
+    configs = list(C.dict(a=C.list(1, 2), b=C.list(3, 4)).sample(4, seed=0, method="stratified"))
+    assert len(set(str(c) for c in configs)) == 4
+
+    with pytest.raises(ValueError):
+        sweep.sample(10, method="grid")
+    with pytest.raises(TypeError):
+        list(sweep.filter(lambda x: True).sample(2, method="lhs"))
+
+
+def _with_double(x):
+    return x | dict(double=2 * x["a"])
+
+
+def test_parallel_apply():
+    sweep = C.dict(a=C.iter(range(20)), b=C.list(0, 1))
+    expected = list(sweep.map(_with_double))
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        assert list(sweep.map(_with_double, executor=pool)) == expected
+        assert list(sweep.map(_with_double, executor=pool, chunksize=3)) == expected
+        unordered = list(sweep.map(_with_double, executor=pool, ordered=False))
+        assert sorted(unordered, key=str) == sorted(expected, key=str)
+        evens = sweep.filter(lambda x: x["a"] % 2 == 0, executor=pool, chunksize=4)
+        assert list(evens) == list(sweep.filter(lambda x: x["a"] % 2 == 0))
+        pushed = sweep.filter(lambda x: x["a"] % 2 == 0, keys=["a"], executor=pool)
+        assert list(pushed) == list(evens)
+        seeds = sweep.apply(lambda x: [x | dict(seed=1), x | dict(seed=2)], executor=pool, chunksize=5)
+        assert list(seeds) == list(sweep.apply(lambda x: [x | dict(seed=1), x | dict(seed=2)]))
+
+        # only a bounded window of the sweep is pulled ahead of the consumer
+        pulled = []
+        def count(x):
+            pulled.append(x)
+            return x
+        infinite = C.dict(a=C.iter(itertools.count())).map(count).map(_with_double, executor=pool, window=4)
+        assert [x["double"] for x in infinite.head(3)] == [0, 2, 4]
+        assert len(pulled) <= 3 + 4
+        with pytest.raises(ValueError):
+            sweep.map(_with_double, executor=pool, window=0)
+
+    with concurrent.futures.ProcessPoolExecutor(2) as pool:
+        assert list(sweep.map(_with_double, executor=pool, chunksize=8)) == expected
+
+
+def test_dump(tmp_path, monkeypatch):
+    sweep = C.dict(a=C.iter(range(100)), b=C.list("x", "y"), model=C.dict(depth=C.list(1, 2), act=None))
+    path = str(tmp_path / "sweep.jsonl")
+    assert sweep.dump(path) == 400
+    loaded = C.load(path)
+    assert len(loaded) == 400
+    assert list(loaded) == list(sweep)
+    assert loaded[137] == sweep[137]
+    assert loaded[-1] == sweep[-1]
+    assert list(loaded[10:20]) == list(sweep)[10:20]
+    assert list(loaded.shard(3, 4)) == list(sweep.shard(3, 4))
+    assert list(loaded * C.dict(seed=C.list(0, 1)))[:2] == [sweep[0] | dict(seed=0), sweep[0] | dict(seed=1)]
+
+    # without pread (e.g. on Windows) reads seek under a lock
+    monkeypatch.setattr(cdict.store, "_HAS_PREAD", False)
+    assert C.load(path)[137] == sweep[137]
+    monkeypatch.undo()
+
+    # unsized sweeps stream to disk just the same
+    evens = C.dict(a=C.iter(range(100))).filter(lambda x: x["a"] % 2 == 0)
+    evens.dump(path)
+    assert C.load(path)[3] == dict(a=6)
+
+    pytest.importorskip("msgpack")
+    path = str(tmp_path / "sweep.msgpack")
+    sweep.dump(path, format="msgpack")
+    loaded = C.load(path)
+    assert list(loaded) == list(sweep)
+    assert loaded[251] == sweep[251]
+    with pytest.raises(ValueError):
+        sweep.dump(path, format="csv")
+
+
+def test_iter_from():
+    calls = []
+    def keep(x):
+        calls.append(x)
+        return x["a"] % 3 != 0
+
+    sweep = C.dict(a=C.iter(range(30)), b=C.list(0, 1)).filter(keep) * C.dict(seed=C.list(1, 2))
+    configs = list(sweep)
+    it = sweep.iter_from()
+    assert [next(it) for _ in range(15)] == configs[:15]
+    cursor = json.loads(json.dumps(it.cursor))
+    del calls[:]
+    assert list(sweep.iter_from(cursor)) == configs[15:]
+    # the filter only runs again from the config in progress, a=5 b=1 at index 11 of the grid
+    assert calls[0] == dict(a=5, b=1)
+    assert len(calls) == 60 - 11
+
+    # indexable sweeps use plain indices
+    grid = C.dict(a=C.iter(range(10)), b=C.list(0, 1))
+    it = grid.iter_from()
+    next(it), next(it), next(it)
+    assert it.cursor == 3
+    assert list(grid.iter_from(3)) == list(grid)[3:]
+
+    # cursors of sums and zips point into each part
+    parts = C.sum([grid.filter(lambda x: x["b"]), grid.map(lambda x: x | dict(c=1))])
+    zipped = parts | C.dict(d=C.iter(range(30)))
+    for c in [parts, zipped]:
+        configs = list(c)
+        it = c.iter_from()
+        for k in range(len(configs) + 1):
+            assert list(c.iter_from(json.loads(json.dumps(it.cursor)))) == configs[k:]
+            next(it, None)
+
+    # one-shot factors after the first can't be iterated again per value of the first
+    def one_shot():
+        return C.list(C.dict(a=1), C.dict(a=2)).filter(lambda x: True) * C.iter(C.dict(b=i) for i in range(2))
+    configs = list(one_shot())
+    assert len(configs) == 4 and list(one_shot().iter_from()) == configs
+    for k in range(len(configs) + 1):
+        it = one_shot().iter_from()
+        for _ in range(k):
+            next(it)
+        assert list(one_shot().iter_from(json.loads(json.dumps(it.cursor)))) == configs[k:]
+
+
+def test_explain(capsys):
+    grid = C.dict(a=C.list(1, 2, 3), b=C.dict(c=C.list(4, 5), d=6))
+    odd = C.dict(e=C.iter(range(7))).filter(lambda x: x["e"] % 2)
+    sweep = grid * odd * C.defaultdict(g=0) * C.dict(g=C.list(1, 2))
+    sweep.explain()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:4] == [
+        "*  n<=84",
+        "  cdict(a=..., b=...)  n=6",
+        "    a=clist(1, 2, 3)  n=3",
+        "    b=cdict(c=..., d=6)  n=2",
+    ]
+    assert lines[5].startswith("  .apply(filter(") and lines[5].endswith("n<=7")
+    assert lines[6:8] == ["    cdict(e=...)  n=7", "      e=citer(range(0, 7))  n=7"]
+    assert lines[9:] == ["  cdict(g=...)  n=2", "    g=clist(1, 2)  n=2"]
+
+    with C.profile() as prof:
+        configs = list(iter(sweep))
+    assert len(configs) == 36
+    stats = prof.get(sweep)
+    assert (stats.items, stats.calls, stats.merges, stats.conflicts) == (36, 1, 36, 36)
+    assert prof.get(odd).items == 3
+    sweep.explain(prof)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("*  n<=84  yielded=36 calls=1 time=")
+    assert lines[0].endswith("merges=36 conflicts=36")
+    # nothing is recorded outside the with block
+    list(sweep)
+    assert prof.get(sweep).items == 36
+
+
+class _stub_service():
+    # stands in for a job database, answering after a delay and tracking how many calls overlap
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def lookup(self, x):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        # later configs answer sooner, so completion order differs from sweep order
+        await asyncio.sleep(0.001 * (10 - x["a"] % 10))
+        self.active -= 1
+        return x["a"] % 3 != 0
+
+
+def test_async():
+    sweep = C.dict(a=C.iter(range(20)), b=C.list(0, 1))
+    expected = list(sweep.filter(lambda x: x["a"] % 3 != 0))
+
+    async def collect(c):
+        return [x async for x in c.aiter()]
+
+    service = _stub_service()
+    assert asyncio.run(collect(sweep.afilter(service.lookup, concurrency=4))) == expected
+    assert service.max_active == 4
+    unordered = asyncio.run(collect(sweep.afilter(service.lookup, concurrency=8, ordered=False)))
+    assert unordered != expected and sorted(unordered, key=str) == sorted(expected, key=str)
+
+    async def with_status(x):
+        await asyncio.sleep(0)
+        return x | dict(done=await service.lookup(x))
+
+    async def seeds(x):
+        await asyncio.sleep(0)
+        return [x | dict(seed=1), x | dict(seed=2)]
+
+    mapped = sweep.amap(with_status).aapply(seeds)
+    assert asyncio.run(collect(mapped)) == [
+        x | dict(done=x["a"] % 3 != 0, seed=seed) for x in sweep for seed in [1, 2]
+    ]
+    # composes with sync operators, and iterates synchronously too
+    combined = sweep.afilter(service.lookup) * C.dict(c=C.list(1, 2)) + C.dict(a=-1)
+    assert list(combined) == [x | dict(c=c) for x in expected for c in [1, 2]] + [dict(a=-1)]
+    assert asyncio.run(collect(combined)) == list(combined)
+    it = combined.iter_from()
+    assert [next(it) for _ in range(5)] == list(combined)[:5]
+    assert list(combined.iter_from(it.cursor)) == list(combined)[5:]
+
+
+def test_compiled_grid(monkeypatch):
+    def sweeps():
+        base = C.dict(model=C.dict(width=C.list(1, 2), depth=3), optim=C.dict(lr=C.list(0.1, 0.2)))
+        yield base * C.dict(model=C.dict(act=C.list("relu", "gelu")), seed=C.lazy(lambda: 0))
+        yield C.dict(a=C.finaldict(b=C.list(1, 2))) * C.dict(c=1)
+        yield C.dict(a=C.dict(b=C.iter(range(3)), c=C.dict(d=C.list(1, 2)))) * C.dict(e=C.list(1, 2), a=C.dict(f=4))
+
+    compiled = [list(c) for c in sweeps()]
+    raw = [[(v.final, v.d["a"].final) for v in c.cdict_iter()] for c in list(sweeps())[1:2]]
+    monkeypatch.setattr(cdict.core, "_compile", lambda c: None)
+    assert compiled == [list(c) for c in sweeps()]
+    # cdict values keep their final flags through the grid
+    assert raw == [[(v.final, v.d["a"].final) for v in c.cdict_iter()] for c in list(sweeps())[1:2]]
+    monkeypatch.undo()
+
+    configs = compiled[0]
+    assert len(configs) == 8
+    assert configs[0] == dict(model=dict(width=1, depth=3, act="relu"), optim=dict(lr=0.1), seed=0)
+    assert list(configs[0]) == ["model", "optim", "seed"]
+    assert list(configs[0]["model"]) == ["width", "depth", "act"]
+    assert all(c._grid() is not None for c in sweeps())
+
+    # anything that needs combining is left to cdict_combine
+    assert (C.dict(a=C.finaldict(b=1)) * C.dict(a=C.dict(c=2)))._grid() is None
+    with pytest.raises(ValueError):
+        list(C.dict(a=C.finaldict(b=1)) * C.dict(a=C.dict(c=2)))
+    assert (C.dict(a=C.overridable(1)) * C.dict(a=2))._grid() is None
+    assert list(C.dict(a=C.overridable(1)) * C.dict(a=2)) == [dict(a=2)]
+    assert (C.finaldict(a=1) * C.dict(b=2))._grid() is None
+    with pytest.raises(ValueError):
+        list(C.finaldict(a=1) * C.dict(b=2))
+
+
+def test_diff():
+    def key(c):
+        return json.dumps(c, sort_keys=True)
+
+    def check(old, new):
+        added, removed = C.diff(old, new)
+        assert sorted(map(key, added)) == sorted(set(map(key, new)) - set(map(key, old)))
+        assert sorted(map(key, removed)) == sorted(set(map(key, old)) - set(map(key, new)))
+        return added, removed
+
+    old = C.dict(lr=C.list(0.1, 0.2, 0.3), model=C.dict(depth=C.list(2, 4), act="relu"), seed=C.iter(range(3)))
+    new = C.dict(lr=C.list(0.1, 0.2, 0.4), model=C.dict(depth=C.list(2, 4), act="relu"), seed=C.iter(range(2)))
+    added, removed = check(old, new)
+    # computed per axis, so the results are grids too
+    assert len(added) == 4 and len(removed) == 10
+    assert list(added) == [dict(lr=0.4, model=dict(depth=d, act="relu"), seed=s) for d in [2, 4] for s in [0, 1]]
+
+    # a one value change in a big grid only builds the slice that changed
+    big = C.dict(**{f"k{i}": C.iter(range(10)) for i in range(6)})
+    bigger = C.dict(**{f"k{i}": C.iter(range(11 if i == 5 else 10)) for i in range(6)})
+    added, removed = C.diff(big, bigger)
+    assert len(added) == 10 ** 5 and len(removed) == 0
+    assert added[0] == dict(k0=0, k1=0, k2=0, k3=0, k4=0, k5=10)
+
+    # different shapes fall back to hashing, in sweep order
+    check(old, new * C.dict(extra=C.list(1, 2)))
+    check(old.filter(lambda x: x["seed"] > 0), new)
+    added, removed = C.diff(C.dict(a=C.list(1, 2)), C.list(C.dict(a=3), C.dict(a=1)))
+    assert list(added) == [dict(a=3)] and list(removed) == [dict(a=2)]
+    assert C.diff(old, old)[0].size() == 0
+
+    # one-shot sides are read once and kept for both results
+    added, removed = C.diff(C.iter(dict(a=i) for i in range(4)), C.iter(dict(a=i) for i in range(2, 6)))
+    assert list(removed) == [dict(a=0), dict(a=1)] and list(added) == [dict(a=4), dict(a=5)]
+
+    # equal values of different types are different configs
+    added, removed = C.diff(C.dict(lr=C.list(0, 1)), C.dict(lr=C.list(0.0, 1.0)))
+    assert [type(x["lr"]) for x in added] == [float, float] and [type(x["lr"]) for x in removed] == [int, int]
+
+
+def test_fingerprints():
+    def reference(c):
+        # the fingerprint is a hash of the config, so must agree with hashing it from scratch
+        return C.fingerprint(json.loads(json.dumps(c)))
+
+    inner = C.dict(depth=C.list(2, 4), act=C.list("relu", "gelu"))
+    sweeps = [
+        C.dict(lr=C.list(0.1, -0.0, 0.0), model=inner, seed=C.iter(range(3))),
+        C.dict(a=C.list(1, 2)) * C.dict(model=inner) + C.list(dict(b=[1, 2]), dict(b=None)),
+        C.dict(model=inner) * C.dict(model=C.dict(width=C.list(8, 16))),
+        C.dict(a=C.list(1, 2), b=C.lazy(lambda: dict(c=[3]))),
+    ]
+    for c in sweeps:
+        pairs = list(c.fingerprints())
+        assert [cfg for _, cfg in pairs] == list(c)
+        assert [fp for fp, _ in pairs] == [reference(cfg) for cfg in c]
+        assert len(set(fp for fp, _ in pairs)) == len(pairs)
+
+    # doesn't depend on key order, only on the config
+    assert C.fingerprint(dict(a=1, b=dict(c=2, d=3))) == C.fingerprint(dict(b=dict(d=3, c=2), a=1))
+    assert C.fingerprint(dict(a=1)) != C.fingerprint(dict(a=1.0))
+    assert C.fingerprint(dict(a=dict(b=1))) != C.fingerprint(dict(a=dict(c=1)))
+    assert len(C.fingerprint(dict(a=1))) == 32
+
+
+def test_frozen():
+    data = C.dict(train=C.dict(path="/data/train", size=100), eval=dict(path="/data/eval", size=10))
+    sweep = C.dict(data=data, lr=C.list(0.1, 0.2)) * C.dict(seed=C.iter(range(3))) + C.dict(x=C.lazy(lambda: dict(a=[1])))
+    frozen = list(sweep.frozen())
+    assert frozen == list(sweep)
+
+    # read only, with the shared data block one object in every config
+    with pytest.raises(TypeError):
+        frozen[0]["lr"] = 0.3  # type: ignore
+    with pytest.raises(TypeError):
+        frozen[0]["data"]["train"]["size"] = 1  # type: ignore
+    assert all(x["data"] is frozen[0]["data"] for x in frozen[:6])
+    assert all(x["data"]["eval"] is frozen[0]["data"]["eval"] for x in frozen[:6])
+
+    # leaves computed separately are interned
+    names = list(C.dict(i=C.iter(range(3))).map(lambda x: dict(name="run" + str(x["i"] // 3))).frozen())
+    assert names[0]["name"] is names[2]["name"]
+
+    # the default still yields fresh mutable copies
+    x, y = sweep[0], sweep[1]
+    assert x["data"] == y["data"] and x["data"] is not y["data"]
+
+
+def test_materialize():
+    sweeps = [
+        C.dict(model=C.dict(width=C.list(8, 16), act=C.list("relu", "gelu")), lr=C.list(1e-3, 1e-4)) * C.finaldict(seed=C.iter(range(300))),
+        C.dict(a=C.list(1, 1.0, True, -0.0, 0.0), b=C.dict()) + C.dict(c=C.list([1], (1,)), b=C.dict(x=2)) + C.list(dict(d={}), dict()),
+        C.dict(a=C.iter(range(1000)), b=C.list("x", "y", "z")).filter(lambda x: x["a"] % 7 > 0),
+    ]
+    for sweep in sweeps:
+        table = sweep.materialize()
+        rows = list(sweep)
+        assert len(table) == len(rows)
+        assert list(table) == rows
+        # equal values of different types stay apart
+        assert [[type(v) for v in row.values()] for row in table] == [[type(v) for v in row.values()] for row in rows]
+        assert [table[i] for i in [0, 5, -1]] == [rows[i] for i in [0, 5, -1]]
+        assert list(table[3:8]) == rows[3:8]
+
+    # a grid is filled straight from its axes, with codes as small as the pools allow
+    table = sweeps[0].materialize()
+    assert sweeps[0]._axes() is not None
+    assert [col.codes.typecode for col in table._columns] == ["B", "B", "B", "H"]
+
+    # rows are rebuilt every time, so mutating one doesn't change the table
+    table[0]["model"]["width"] = 0
+    assert table[0]["model"]["width"] == 8
+    assert table.head(3).size() == 3
+
+    empty = (C.dict(a=C.list(1)) * C.dict(b=C.list())).materialize()
+    assert len(empty) == 0 and list(empty) == []
+
+    with pytest.raises(TypeError):
+        C.list(1, 2).materialize()
+
+
 def test_readme_code():
     readme_file = os.path.join(os.path.dirname(__file__), '..', 'README.md')
     with open(readme_file) as f:
@@ -582,5 +1395,22 @@ if __name__ == "__main__":
     test_or_distribution_property()
     test_combiners()
     test_lazy()
+    test_lazy_cache()
+    test_len()
+    test_getitem()
+    test_shard()
+    test_long_sums()
+    test_to_columns()
+    test_filter_pushdown()
+    test_distinct()
+    test_sample()
+    test_space_filling_sample()
+    test_parallel_apply()
+    test_iter_from()
+    test_diff()
+    test_fingerprints()
+    test_frozen()
+    test_materialize()
+    test_async()
     test_readme_code()
     test_types()